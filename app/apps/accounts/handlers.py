@@ -1,13 +1,29 @@
+import asyncio
 import logging
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Awaitable, Callable, Hashable
 from contextlib import asynccontextmanager
 
-from aiocache import cached
 from usso import UserData
 from usso.client import AsyncUssoClient
 
 from apps.accounts.schemas import Profile
 from server.config import Settings
+from utils.batching import BatchLoader
+from utils.cache import AsyncCache
+
+
+def _identity_cache(name: str) -> AsyncCache:
+    return AsyncCache(
+        name,
+        max_size=Settings.identity_cache_size,
+        ttl=Settings.identity_cache_ttl,
+        stale_ttl=Settings.identity_cache_stale_ttl,
+        negative_ttl=Settings.identity_cache_negative_ttl,
+    )
+
+
+usso_users: AsyncCache[UserData] = _identity_cache("usso_user")
+user_profiles: AsyncCache[Profile] = _identity_cache("user_profile")
 
 
 @asynccontextmanager
@@ -18,26 +34,92 @@ async def get_usso_session() -> AsyncGenerator[AsyncUssoClient]:
         yield session
 
 
-@cached(ttl=60 * 60 * 24)
-async def get_usso_user(credentials: dict) -> UserData:
+def credentials_key(credentials: dict) -> tuple:
+    return tuple(sorted(credentials.items()))
+
+
+async def fetch_usso_user(session: AsyncUssoClient, credentials: dict) -> UserData:
     return
-    async with get_usso_session() as session:
-        u = await session.get_user_by_credentials(credentials)
-        return u
+    u = await session.get_user_by_credentials(credentials)
+    return u
 
 
-@cached(ttl=60 * 60 * 24)
-async def get_user_profile(user_id: str, **kwargs: object) -> Profile:
+async def fetch_user_profile(session: AsyncUssoClient, user_id: str) -> Profile:
     return
+    response = await session.get(
+        f"{Settings.profile_service_url}/profiles/{user_id}", timeout=20
+    )
+    if response.status_code == 200:
+        return Profile(**response.json())
+    elif response.status_code >= 400 and response.status_code != 404:
+        logging.error(response.text)
+        response.raise_for_status()
+
+    profile = await session.create_profile(user_id=user_id)
+    return Profile(**profile)
+
+
+async def _fan_out(
+    keys: list[Hashable],
+    fetch: Callable[[AsyncUssoClient, Hashable], Awaitable[object]],
+) -> dict[Hashable, object]:
+    """Resolve a batch over one USSO session with bounded concurrency.
+
+    USSO has no batch lookup endpoint, so a window of distinct keys shares a
+    session and at most `USSO_CONCURRENCY` requests are in flight.
+    """
+    semaphore = asyncio.Semaphore(Settings.usso_concurrency)
+
     async with get_usso_session() as session:
-        response = await session.get(
-            f"{Settings.profile_service_url}/profiles/{user_id}", timeout=20
-        )
-        if response.status_code == 200:
-            return Profile(**response.json())
-        elif response.status_code >= 400 and response.status_code != 404:
-            logging.error(response.text)
-            response.raise_for_status()
-
-        profile = await session.create_profile(user_id=user_id)
-        return Profile(**profile)
+
+        async def fetch_one(key: Hashable) -> object:
+            async with semaphore:
+                try:
+                    return await fetch(session, key)
+                except Exception as e:
+                    return e
+
+        results = await asyncio.gather(*(fetch_one(key) for key in keys))
+    return dict(zip(keys, results, strict=True))
+
+
+async def _load_usso_users(keys: list[Hashable]) -> dict[Hashable, object]:
+    return await _fan_out(
+        keys, lambda session, key: fetch_usso_user(session, dict(key))
+    )
+
+
+async def _load_user_profiles(keys: list[Hashable]) -> dict[Hashable, object]:
+    return await _fan_out(keys, fetch_user_profile)
+
+
+usso_user_loader = BatchLoader(
+    "usso_user",
+    _load_usso_users,
+    window=Settings.usso_batch_window,
+    max_batch=Settings.usso_batch_size,
+)
+user_profile_loader = BatchLoader(
+    "user_profile",
+    _load_user_profiles,
+    window=Settings.usso_batch_window,
+    max_batch=Settings.usso_batch_size,
+)
+
+
+async def get_usso_user(credentials: dict) -> UserData:
+    key = credentials_key(credentials)
+    return await usso_users.get(key, lambda: usso_user_loader.load(key))
+
+
+async def get_user_profile(user_id: str, **kwargs: object) -> Profile:
+    key = str(user_id)
+    return await user_profiles.get(key, lambda: user_profile_loader.load(key))
+
+
+def invalidate_user_profile(user_id: str, profile: Profile | None = None) -> None:
+    """Drop a cached profile, or replace it when the new one is known."""
+    if profile is None:
+        user_profiles.invalidate(str(user_id))
+    else:
+        user_profiles.set(str(user_id), profile)
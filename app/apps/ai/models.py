@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import ClassVar
+
+from fastapi_mongo_base.models import BaseEntity
+from fastapi_mongo_base.tasks import TaskMixin
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from .schemas import MessengerMetaDataSchema
+
+
+class OCRDocument(TaskMixin, BaseEntity):
+    """The OCR job for one document content, keyed by its SHA-256.
+
+    `task_status` goes init (being submitted), processing (submitted at
+    `task_start_at`), completed. `requesters` holds every chat still
+    waiting for the result; each is removed once it has been sent, and
+    `delivery_claimed_at` keeps two deliverers from sending at once.
+    """
+
+    content_hash: str
+    ocr_uid: str | None = None
+    requesters: list[MessengerMetaDataSchema] = Field(default_factory=list)
+    next_poll_at: datetime | None = None
+    poll_interval: float = 0
+    delivery_claimed_at: datetime | None = None
+
+    class Settings(BaseEntity.Settings):
+        indexes: ClassVar[list[IndexModel]] = [
+            *BaseEntity.Settings.indexes,
+            IndexModel([("content_hash", ASCENDING)], unique=True),
+            IndexModel([("task_status", ASCENDING), ("next_poll_at", ASCENDING)]),
+        ]
+
+
+class OCRAlbum(BaseEntity):
+    """Files sent together as one album, answered with one combined result.
+
+    `parts` maps each file's position to its OCR job id, or to "" when
+    the job failed; the album is sent once all `size` parts are in.
+    """
+
+    album_id: str
+    requester: MessengerMetaDataSchema
+    size: int
+    parts: dict[str, str] = Field(default_factory=dict)
+    sent: bool = False
+
+    class Settings(BaseEntity.Settings):
+        indexes: ClassVar[list[IndexModel]] = [
+            *BaseEntity.Settings.indexes,
+            IndexModel([("album_id", ASCENDING)], unique=True),
+        ]
@@ -1,20 +1,45 @@
+import asyncio
+import hashlib
 import logging
-from collections.abc import AsyncGenerator, Generator
+import os
+import shutil
+import tempfile
+import uuid
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator
 from contextlib import asynccontextmanager, contextmanager
-from io import BytesIO
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
+from typing import BinaryIO
 from urllib.parse import urlparse
 
 import httpx
 from fastapi_mongo_base.schemas import UserOwnedEntitySchema
-from fastapi_mongo_base.tasks import TaskMixin
+from fastapi_mongo_base.tasks import TaskMixin, TaskStatusEnum
 from fastapi_mongo_base.utils import basic
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
 
-from apps.bots.handlers import get_bot
 from server.config import Settings
+from utils import media, metrics
+from utils.http_clients import HttpClients
 
+from .models import OCRAlbum, OCRDocument
 from .schemas import MessengerMetaDataSchema
 
+# Telegram refuses these for good, e.g. the user blocked the bot
+PERMANENT_SEND_ERRORS = {400, 403}
+NO_TEXT_FOUND = "No text was found in this file."
+OCR_FAILED = "Sorry, this file could not be read. Please send it again."
+
+
+def file_hash(file: BinaryIO) -> str:
+    """SHA-256 of `file`, read in chunks; the position is reset afterwards."""
+    digest = hashlib.file_digest(file, "sha256").hexdigest()
+    file.seek(0)
+    return digest
+
 
 class OCRSchema(UserOwnedEntitySchema, TaskMixin):
     file_url: str
@@ -29,7 +54,8 @@ class OCRSchema(UserOwnedEntitySchema, TaskMixin):
 
 class OCRClient:
     def __init__(self, **kwargs: object) -> None:
-        super().__init__(**kwargs)
+        super().__init__()
+        self.shared = not kwargs
         self.httpx_kwargs = {
             "base_url": Settings.ai_url,
             "headers": {"x-api-key": Settings.ai_api_key or ""},
@@ -38,6 +64,10 @@ class OCRClient:
 
     @asynccontextmanager
     async def aclient(self) -> AsyncGenerator[httpx.AsyncClient]:
+        if self.shared:
+            yield HttpClients().get("ai")
+            return
+
         async with httpx.AsyncClient(**self.httpx_kwargs) as client:
             yield client
 
@@ -46,20 +76,387 @@ class OCRClient:
         with httpx.Client(**self.httpx_kwargs) as client:
             yield client
 
+    async def _fetch_result(self, ocr_uid: str) -> tempfile.SpooledTemporaryFile:
+        async with self.aclient() as client:
+            response = await client.send(
+                client.build_request("GET", f"/ocrs/{ocr_uid}/result"), stream=True
+            )
+            try:
+                response.raise_for_status()
+                return await media.spool(response.aiter_bytes())
+            finally:
+                await response.aclose()
+
+    async def adeliver(
+        self,
+        ocr_uid: str,
+        requesters: list[MessengerMetaDataSchema],
+        delivered: Callable[[MessengerMetaDataSchema], Awaitable[None]] | None = None,
+    ) -> None:
+        """Send the result of job `ocr_uid` to every requester.
+
+        The result is streamed into a spool, so large books are never held
+        in memory whole. Album parts are only recorded; their album is sent
+        once every part is in. `delivered` is awaited after each requester.
+        """
+        from apps.bots import media_cache
+
+        for requester in requesters:
+            if requester.file_unique_id:
+                await media_cache.save_result(
+                    requester.file_unique_id, "ocr_job", ocr_uid
+                )
+            if requester.album_id:
+                await self.arecord_album_part(requester, ocr_uid)
+                if delivered:
+                    await delivered(requester)
+
+        requesters = [requester for requester in requesters if not requester.album_id]
+        if not requesters:
+            return
+        with await self._fetch_result(ocr_uid) as result:
+            size = result.seek(0, os.SEEK_END)
+            for requester in requesters:
+                sent = await self._try_send_result(requester, ocr_uid, result, size)
+                if sent and delivered:
+                    await delivered(requester)
+
+    async def _try_send_result(
+        self,
+        requester: MessengerMetaDataSchema,
+        ocr_uid: str,
+        result: BinaryIO,
+        size: int,
+    ) -> bool:
+        """Send the result to one requester; False when it should be retried.
+
+        A chat that rejects the result for good (bot blocked, chat gone) is
+        dropped, so it does not hold up the requesters after it.
+        """
+        try:
+            await self._send_result(requester, ocr_uid, result, size)
+        except ApiTelegramException as e:
+            if e.error_code not in PERMANENT_SEND_ERRORS:
+                logging.warning(
+                    "sending OCR %s to %s failed: %s", ocr_uid, requester.chat_id, e
+                )
+                metrics.incr("ocr.delivery_retried")
+                return False
+            logging.warning("dropping OCR %s for %s: %s", ocr_uid, requester.chat_id, e)
+            metrics.incr("ocr.delivery_dropped")
+        except Exception:
+            logging.exception("sending OCR %s to %s failed", ocr_uid, requester.chat_id)
+            metrics.incr("ocr.delivery_retried")
+            return False
+        return True
+
+    async def acreate_album(self, meta_data: dict, size: int) -> str:
+        """Start collecting the results of an album of `size` files."""
+        album = OCRAlbum(
+            album_id=uuid.uuid4().hex,
+            requester=MessengerMetaDataSchema.model_validate(meta_data),
+            size=size,
+        )
+        await album.insert()
+        return album.album_id
+
+    async def arecord_album_part(
+        self, requester: MessengerMetaDataSchema, ocr_uid: str | None
+    ) -> None:
+        """Record an album part's job, None when it failed.
+
+        The album is sent by whoever records its last missing part.
+        """
+        collection = OCRAlbum.get_pymongo_collection()
+        album = await collection.find_one_and_update(
+            {"album_id": requester.album_id},
+            {"$set": {f"parts.{requester.album_index}": ocr_uid or ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if album is None or len(album["parts"]) < album["size"]:
+            return
+        claimed = await collection.find_one_and_update(
+            {"album_id": requester.album_id, "sent": {"$ne": True}},
+            {"$set": {"sent": True}},
+        )
+        if claimed is not None:
+            await self._send_album(OCRAlbum.model_validate(album))
+
+    async def _send_album(self, album: OCRAlbum) -> None:
+        """Send the parts of `album` in order as one result."""
+        with tempfile.SpooledTemporaryFile(
+            max_size=Settings.media_spool_threshold
+        ) as combined:
+            for index in range(album.size):
+                if index:
+                    combined.write(b"\n\n---\n\n")
+                ocr_uid = album.parts.get(str(index))
+                if not ocr_uid:
+                    combined.write(f"*File {index + 1} could not be read.*".encode())
+                    continue
+                with await self._fetch_result(ocr_uid) as part:
+                    await asyncio.to_thread(shutil.copyfileobj, part, combined)
+            size = combined.tell()
+            metrics.incr("ocr.albums_sent")
+            await self._send_result(album.requester, album.album_id, combined, size)
+
+    async def _send_result(
+        self,
+        requester: MessengerMetaDataSchema,
+        ocr_uid: str,
+        result: BinaryIO,
+        size: int,
+    ) -> None:
+        """Send short results as text, large ones zipped, the rest as markdown."""
+        from apps.bots.handlers import get_bot
+
+        bot = get_bot(requester.bot_name)
+        stem = Path(requester.file_name or ocr_uid).stem
+        result.seek(0)
+        if size == 0:
+            # Telegram rejects empty files and blank messages
+            await bot.send_message(requester.chat_id, NO_TEXT_FOUND)
+        elif size <= Settings.ocr_inline_max_bytes:
+            text = result.read().decode(errors="replace")
+            await bot.send_message(
+                requester.chat_id, text if text.strip() else NO_TEXT_FOUND
+            )
+        elif 0 < Settings.ocr_compress_min_bytes <= size:
+            archive = await asyncio.to_thread(media.zip_file, result, f"{stem}.md")
+            with archive:
+                await bot.send_document(
+                    requester.chat_id, types.InputFile(archive, f"{stem}.zip")
+                )
+        else:
+            await bot.send_document(
+                requester.chat_id, types.InputFile(result, f"{stem}.md")
+            )
+
     @basic.try_except_wrapper
     async def aprocess_ocr_webhook(self, ocr_webhook: OCRSchema) -> None:
         logging.info("Processing OCR webhook: %s", ocr_webhook)
-        file_name = Path(urlparse(ocr_webhook.file_url).path)
+        meta_data = MessengerMetaDataSchema.model_validate(ocr_webhook.meta_data or {})
+        if not meta_data.content_hash:
+            # submitted before jobs were tracked
+            if not meta_data.file_name:
+                meta_data.file_name = Path(urlparse(ocr_webhook.file_url).path).name
+            await self.adeliver(str(ocr_webhook.uid), [meta_data])
+        elif ocr_webhook.task_status == TaskStatusEnum.error:
+            await self.afail(meta_data.content_hash)
+        elif ocr_webhook.task_status in (
+            TaskStatusEnum.init,
+            TaskStatusEnum.processing,
+            TaskStatusEnum.paused,
+        ):
+            return  # a progress report
+        else:
+            await self.acomplete(
+                meta_data.content_hash, str(ocr_webhook.uid), "webhook"
+            )
 
-        async with self.aclient() as client:
-            request = await client.get(f"/ocrs/{ocr_webhook.uid}/result")
-            request.raise_for_status()
+    async def acomplete(self, content_hash: str, ocr_uid: str, source: str) -> None:
+        """Mark the job done and deliver it; safe to call more than once."""
+        now = datetime.now(UTC)
+        document = await OCRDocument.get_pymongo_collection().find_one_and_update(
+            {
+                "content_hash": content_hash,
+                "task_status": {"$ne": TaskStatusEnum.completed},
+            },
+            {
+                "$set": {
+                    "task_status": TaskStatusEnum.completed,
+                    "ocr_uid": ocr_uid,
+                    "task_end_at": now,
+                }
+            },
+        )
+        if document is not None:
+            metrics.incr(f"ocr.completed.{source}")
+            submitted = document.get("task_start_at") or document["created_at"]
+            metrics.observe(
+                "ocr.completion_latency",
+                (
+                    now - submitted.replace(tzinfo=submitted.tzinfo or UTC)
+                ).total_seconds(),
+            )
+        await self.adeliver_pending(content_hash)
+
+    async def afail(
+        self, content_hash: str, task_status: TaskStatusEnum | None = None
+    ) -> None:
+        """Forget a failed job and tell everyone waiting for it.
+
+        The next request for the content submits it again. With
+        `task_status`, only a job still in that state is failed.
+        """
+        query: dict[str, object] = {"content_hash": content_hash}
+        if task_status is not None:
+            query["task_status"] = task_status
+        document = await OCRDocument.get_pymongo_collection().find_one_and_delete(query)
+        if document is None:
+            return
+
+        requesters = [
+            MessengerMetaDataSchema.model_validate(requester)
+            for requester in document["requesters"]
+        ]
+        logging.warning(
+            "OCR job %s failed, %d requesters told",
+            document.get("ocr_uid"),
+            len(requesters),
+        )
+        metrics.incr("ocr.failed")
+        for requester in requesters:
+            if requester.album_id:
+                # the rest of the album is still sent
+                await self.arecord_album_part(requester, None)
+            else:
+                await self._send_failure(requester)
+
+    async def _send_failure(self, requester: MessengerMetaDataSchema) -> None:
+        from apps.bots.handlers import get_bot
+
+        try:
+            await get_bot(requester.bot_name).send_message(
+                requester.chat_id, OCR_FAILED
+            )
+        except Exception:
+            logging.exception("telling %s about a failed OCR failed", requester.chat_id)
+
+    async def adeliver_pending(self, content_hash: str) -> None:
+        """Send a completed job to the requesters it has not reached yet.
+
+        Delivery is claimed for `OCR_DELIVERY_LEASE` seconds and every
+        requester is removed as soon as its result is sent, so a delivery
+        cut short by a restart resumes where it stopped.
+        """
+        now = datetime.now(UTC)
+        collection = OCRDocument.get_pymongo_collection()
+        document = await collection.find_one_and_update(
+            {
+                "content_hash": content_hash,
+                "task_status": TaskStatusEnum.completed,
+                "requesters": {"$ne": []},
+                "$or": [
+                    {"delivery_claimed_at": None},
+                    {
+                        "delivery_claimed_at": {
+                            "$lt": now - timedelta(seconds=Settings.ocr_delivery_lease)
+                        }
+                    },
+                ],
+            },
+            {"$set": {"delivery_claimed_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            return
+
+        async def delivered(requester: MessengerMetaDataSchema) -> None:
+            await collection.update_one(
+                {"content_hash": content_hash},
+                {"$pull": {"requesters": requester.model_dump()}},
+            )
+
+        requesters = [
+            MessengerMetaDataSchema.model_validate(requester)
+            for requester in document["requesters"]
+        ]
+        try:
+            await self.adeliver(document["ocr_uid"], requesters, delivered)
+        finally:
+            await collection.update_one(
+                {"content_hash": content_hash},
+                {"$unset": {"delivery_claimed_at": ""}},
+            )
 
-            file_content = BytesIO(request.content)
-            file_content.name = f"{file_name.stem}.md"
+    async def asubmit_document(
+        self,
+        content: BinaryIO,
+        meta_data: dict,
+        upload: Callable[[], Awaitable[str]],
+    ) -> None:
+        """OCR `content` for `meta_data`'s chat, running one job per content.
 
-            bot = get_bot(ocr_webhook.meta_data.bot_name)
-            await bot.send_document(ocr_webhook.meta_data.chat_id, file_content)
+        A finished job's result is delivered at once and a running job gets
+        the requester attached; only new content is uploaded (`upload()`
+        returns its URL) and submitted.
+        """
+        content_hash = await asyncio.to_thread(file_hash, content)
+        requester = MessengerMetaDataSchema.model_validate({
+            **meta_data,
+            "content_hash": content_hash,
+        })
+        if await self._join(requester):
+            return
+
+        try:
+            await OCRDocument(
+                content_hash=content_hash,
+                requesters=[requester],
+                task_status=TaskStatusEnum.init,
+            ).insert()
+        except DuplicateKeyError:
+            # submitted concurrently by someone else
+            if await self._join(requester):
+                return
+            raise
+
+        metrics.incr("ocr.submitted")
+        try:
+            job = await self.asubmit_ocr_task(
+                await upload(), requester.model_dump(exclude_none=True)
+            )
+        except BaseException:
+            # others may have joined already; they are told as well
+            await self.afail(content_hash, TaskStatusEnum.init)
+            raise
+
+        now = datetime.now(UTC)
+        # the webhook may have completed the job already
+        await OCRDocument.get_pymongo_collection().update_one(
+            {"content_hash": content_hash, "task_status": TaskStatusEnum.init},
+            {
+                "$set": {
+                    "ocr_uid": str(job.uid),
+                    "task_status": TaskStatusEnum.processing,
+                    "task_start_at": now,
+                    "poll_interval": Settings.ocr_poll_initial_interval,
+                    "next_poll_at": now
+                    + timedelta(seconds=Settings.ocr_poll_initial_interval),
+                }
+            },
+        )
+
+    async def _join(self, requester: MessengerMetaDataSchema) -> bool:
+        """Attach `requester` to the job for its content, if there is one."""
+        collection = OCRDocument.get_pymongo_collection()
+        joined = await collection.update_one(
+            {
+                "content_hash": requester.content_hash,
+                "task_status": {"$ne": TaskStatusEnum.completed},
+            },
+            {"$push": {"requesters": requester.model_dump()}},
+        )
+        if joined.modified_count:
+            metrics.incr("ocr.coalesced")
+            return True
+
+        document = await OCRDocument.find_one({
+            "content_hash": requester.content_hash,
+            "task_status": TaskStatusEnum.completed,
+        })
+        if document is None:
+            return False
+        metrics.incr("ocr.cache_hit")
+        await self.adeliver(document.ocr_uid, [requester])
+        return True
+
+    async def aget_ocr_task(self, ocr_uid: str) -> OCRSchema:
+        async with self.aclient() as client:
+            response = await client.get(f"/ocrs/{ocr_uid}")
+            response.raise_for_status()
+            return OCRSchema.model_validate(response.json())
 
     async def asubmit_ocr_task(self, file_url: str, meta_data: dict) -> OCRSchema:
         from apps.ai import routes
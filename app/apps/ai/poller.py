@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import singleton
+from fastapi_mongo_base.tasks import TaskStatusEnum
+
+from server.config import Settings
+from utils import metrics
+
+from .models import OCRDocument
+from .ocr import OCRClient
+
+
+def _age(now: datetime, moment: datetime) -> float:
+    return (now - moment.replace(tzinfo=moment.tzinfo or UTC)).total_seconds()
+
+
+class OCRPoller(metaclass=singleton.Singleton):
+    """Finish OCR jobs whose webhook never arrived.
+
+    Jobs are checked at the OCR service once they are due; each check that
+    finds a job still running doubles its interval, from
+    `OCR_POLL_INITIAL_INTERVAL` up to `OCR_POLL_MAX_INTERVAL`, so the
+    service is asked about long books rarely. Completed jobs with
+    requesters left (a delivery cut short) are delivered again, and
+    submissions that never got a job id are failed.
+    """
+
+    task: asyncio.Task | None = None
+
+    def __init__(self) -> None:
+        self.client = OCRClient()
+        self.queue_age = 0.0
+        self.pending = 0
+        metrics.gauge("ocr.queue_age", lambda: self.queue_age)
+        metrics.gauge("ocr.pending", lambda: self.pending)
+
+    async def setup(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def shutdown(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                delay = await self.poll()
+            except Exception:
+                logging.exception("polling OCR jobs failed")
+                delay = Settings.ocr_poll_initial_interval
+            await asyncio.sleep(delay)
+
+    async def poll(self) -> float:
+        """Check one batch of due jobs; return how long to sleep."""
+        now = datetime.now(UTC)
+        stale = await OCRDocument.find({
+            "task_status": TaskStatusEnum.init,
+            "created_at": {"$lt": now - timedelta(seconds=Settings.ocr_submit_timeout)},
+        }).to_list()
+        for document in stale:
+            await self.client.afail(document.content_hash, TaskStatusEnum.init)
+
+        due = (
+            await OCRDocument
+            .find({
+                "task_status": TaskStatusEnum.processing,
+                "next_poll_at": {"$lte": now},
+            })
+            .sort("next_poll_at")
+            .limit(Settings.ocr_poll_batch_size)
+            .to_list()
+        )
+        undelivered = (
+            await OCRDocument
+            .find({
+                "task_status": TaskStatusEnum.completed,
+                "requesters": {"$ne": []},
+            })
+            .limit(Settings.ocr_poll_batch_size)
+            .to_list()
+        )
+        await asyncio.gather(
+            *(self.check(document) for document in due),
+            *(
+                self.client.adeliver_pending(document.content_hash)
+                for document in undelivered
+            ),
+            return_exceptions=True,
+        )
+        await self.measure(now)
+
+        if len(due) == Settings.ocr_poll_batch_size:
+            return 0
+        upcoming = (
+            await OCRDocument
+            .find({"task_status": TaskStatusEnum.processing})
+            .sort("next_poll_at")
+            .first_or_none()
+        )
+        if upcoming is None or upcoming.next_poll_at is None:
+            return Settings.ocr_poll_max_interval
+        wait = -_age(datetime.now(UTC), upcoming.next_poll_at)
+        return min(max(wait, 1.0), Settings.ocr_poll_max_interval)
+
+    async def check(self, document: OCRDocument) -> None:
+        metrics.incr("ocr.polls")
+        try:
+            job = await self.client.aget_ocr_task(document.ocr_uid)
+        except httpx.HTTPError:
+            logging.warning("checking OCR job %s failed", document.ocr_uid)
+            job = None
+
+        if job is not None and job.task_status in TaskStatusEnum.finishes():
+            if job.task_status == TaskStatusEnum.error:
+                await self.client.afail(document.content_hash)
+            else:
+                await self.client.acomplete(
+                    document.content_hash, document.ocr_uid, "poll"
+                )
+            return
+
+        interval = min(
+            max(document.poll_interval, Settings.ocr_poll_initial_interval) * 2,
+            Settings.ocr_poll_max_interval,
+        )
+        await OCRDocument.get_pymongo_collection().update_one(
+            {"_id": document.id, "task_status": TaskStatusEnum.processing},
+            {
+                "$set": {
+                    "poll_interval": interval,
+                    "next_poll_at": datetime.now(UTC) + timedelta(seconds=interval),
+                }
+            },
+        )
+
+    async def measure(self, now: datetime) -> None:
+        pending = OCRDocument.find({"task_status": TaskStatusEnum.processing})
+        self.pending = await pending.count()
+        oldest = await pending.sort("task_start_at").first_or_none()
+        self.queue_age = (
+            _age(now, oldest.task_start_at) if oldest and oldest.task_start_at else 0.0
+        )
@@ -6,3 +6,8 @@ class MessengerMetaDataSchema(BaseModel):
     chat_id: int | None = None
     user_id: str | None = None
     bot_name: str | None = None
+    file_unique_id: str | None = None
+    file_name: str | None = None
+    content_hash: str | None = None
+    album_id: str | None = None
+    album_index: int | None = None
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+from apps.bots import base_bot, schemas
+from server.config import Settings
+from utils import metrics
+
+AlbumHandler = Callable[[list[schemas.MessageOwned], base_bot.BaseBot], Awaitable[None]]
+
+
+class AlbumCollector:
+    """Gather the messages of an album and hand them over together.
+
+    Telegram delivers an album as separate messages sharing a
+    `media_group_id`. The album is complete once no new part has arrived
+    for `ALBUM_WINDOW` seconds; it is then handled in the background, in
+    message order, so the chat's update queue is not held meanwhile.
+    """
+
+    def __init__(self, handler: AlbumHandler) -> None:
+        self.handler = handler
+        self.pending: dict[tuple[str, str], list[schemas.MessageOwned]] = {}
+        self.timers: dict[
+            tuple[str, str], tuple[asyncio.TimerHandle, base_bot.BaseBot]
+        ] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    def add(self, message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
+        key = (bot.token, message.media_group_id)
+        self.pending.setdefault(key, []).append(message)
+        if key in self.timers:
+            self.timers[key][0].cancel()
+        timer = asyncio.get_running_loop().call_later(
+            Settings.album_window, self._flush, key, bot
+        )
+        self.timers[key] = (timer, bot)
+
+    async def drain(self, grace_period: float | None = None) -> None:
+        """Handle the albums still being gathered now and wait for all albums
+        being handled, for at most `grace_period` seconds."""
+        for key, (timer, bot) in list(self.timers.items()):
+            timer.cancel()
+            self._flush(key, bot)
+        if not self.tasks:
+            return
+        _, pending = await asyncio.wait(self.tasks, timeout=grace_period)
+        if pending:
+            logging.warning("album drain timed out, %d left", len(pending))
+
+    def _flush(self, key: tuple[str, str], bot: base_bot.BaseBot) -> None:
+        del self.timers[key]
+        messages = sorted(self.pending.pop(key), key=lambda m: m.message_id)
+        metrics.incr("bots.albums")
+        task = asyncio.create_task(self.handler(messages, bot))
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error("handling album failed", exc_info=task.exception())
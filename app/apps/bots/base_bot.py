@@ -1,23 +1,47 @@
 import asyncio
+import dataclasses
+import itertools
 import logging
 import os
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from io import BytesIO
+from typing import TYPE_CHECKING
 
 import singleton
+from telebot import asyncio_helper
 from telebot.async_telebot import AsyncTeleBot
 from telebot.asyncio_helper import ApiTelegramException
 
+from apps.bots.edits import EditTracker, QueuedEdit, edit_key, fingerprint
+from server.config import Settings
+from utils import markdown, metrics
+from utils.downloads import iter_parallel_download
+from utils.http_clients import HttpClients
+from utils.ratelimit import ChatRateLimiter
 from utils.texttools import split_text
 
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+
+@dataclasses.dataclass(frozen=True)
+class BotIdentity:
+    id: int
+    username: str | None
+    bot_type: str
+
 
 class BaseBot(AsyncTeleBot):
     token = ""
     # bot_type = "telegram"
     me = ""
     webhook_route = ""
+    identity: BotIdentity | None = None
 
     @property
     def bot_type(self) -> str:
+        if self.identity:
+            return self.identity.bot_type
         return "bale" if len(self.token) == 51 else "telegram"
 
     @property
@@ -26,7 +50,8 @@ class BaseBot(AsyncTeleBot):
             base_link = "https://t.me"
         elif self.bot_type == "bale":
             base_link = "https://ble.ir"
-        return f"{base_link}/{self.me}"
+        username = self.identity.username if self.identity else None
+        return f"{base_link}/{username or self.me}"
 
     def __init__(self, token: str | None = None, **kwargs: object) -> None:
         if token:
@@ -37,41 +62,144 @@ class BaseBot(AsyncTeleBot):
             **kwargs,
         )
         self.lock = asyncio.Lock()
+        self.telethon: TelegramClient | None = None
+        self.rate_limiter = ChatRateLimiter(
+            global_rate=Settings.bot_global_rate,
+            chat_rate=Settings.bot_chat_rate,
+            group_rate=Settings.bot_group_rate,
+        )
+        self.edits = EditTracker(Settings.edit_cache_size)
+        metrics.gauge(
+            f"bot.outbound.slowest_chats.{self.token.split(':')[0]}",
+            self.rate_limiter.slowest_chats,
+        )
 
     def __str__(self) -> str:
         return self.link
 
+    async def refresh_identity(self) -> BotIdentity:
+        user = await self.get_me()
+        bot_type = "bale" if len(self.token) == 51 else "telegram"
+        self.identity = BotIdentity(
+            id=user.id, username=user.username, bot_type=bot_type
+        )
+        return self.identity
+
+    async def get_identity(self) -> BotIdentity:
+        """Return the bot's own identity, calling `get_me` only the first time."""
+        return self.identity or await self.refresh_identity()
+
+    async def throttled[T](
+        self,
+        chat_id: int | str | None,
+        method: Callable[..., Awaitable[T]],
+        *args: object,
+        **kwargs: object,
+    ) -> T:
+        """Call an outbound Bot API method within the bot's rate limits.
+
+        429 answers pause the chat's budget for `retry_after` and the call
+        is queued again, up to `BOT_RETRY_AFTER_ATTEMPTS` times.
+        """
+        for attempt in itertools.count():
+            await self.rate_limiter.acquire(chat_id)
+            try:
+                return await method(*args, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 429 or attempt >= Settings.bot_retry_after_attempts:
+                    raise
+                parameters = e.result_json.get("parameters") or {}
+                retry_after = parameters.get("retry_after", 1)
+                logging.warning(
+                    "%s throttled for %ss on %s", self, retry_after, chat_id
+                )
+                metrics.incr("bot.outbound.retry_after")
+                self.rate_limiter.pause(chat_id, retry_after)
+                for arg in (*args, *kwargs.values()):
+                    file = getattr(arg, "file", arg)  # types.InputFile
+                    if hasattr(file, "seek"):
+                        file.seek(0)
+
+    def render_markdown(self, text: str, kwargs: dict) -> str:
+        """Send Markdown as entities unless the caller picked a parse mode.
+
+        Only Telegram gets entities; Bale keeps the bot's parse mode and the
+        plain-text fallback below.
+        """
+        if (
+            kwargs.get("parse_mode") is not None
+            or kwargs.get("entities")
+            or self.bot_type != "telegram"
+        ):
+            return text
+        plain, entities = markdown.render(text)
+        kwargs["parse_mode"] = ""
+        if not plain.strip():
+            return text
+        kwargs["entities"] = entities
+        metrics.incr("bot.outbound.rendered")
+        return plain
+
     async def edit_message_text(
         self, text: str, *args: object, **kwargs: object
     ) -> None:
+        target = kwargs.get("chat_id") or kwargs.get("inline_message_id")
+        key = edit_key(
+            kwargs.get("chat_id"),
+            kwargs.get("message_id"),
+            kwargs.get("inline_message_id"),
+        )
+        text = text[:4096]
+        payload = {"text": self.render_markdown(text, kwargs), **kwargs}
+        if key is not None and not self.edits.queue(key, payload):
+            return
+
+        edit = QueuedEdit(self.edits, key, payload, super().edit_message_text)
         try:
-            await super().edit_message_text(text=text[:4096], **kwargs)
+            await self.throttled(target, edit)
         except ApiTelegramException as e:
             if (
                 "message is not modified:" in str(e)
                 or "message text is empty" in str(e)
                 or "MESSAGE_TOO_LONG" in str(e)
             ):
+                if key is not None and "message is not modified:" in str(e):
+                    self.edits.remember(key, *fingerprint(edit.payload))
                 logging.warning("edit_message_text error: %s", e)
             elif "can't parse entities" in str(e):
+                metrics.incr("bot.outbound.parse_fallback")
                 kwargs["parse_mode"] = ""
+                kwargs.pop("entities", None)
                 await self.edit_message_text(text, *args, **kwargs)
                 logging.warning("edit_message_text error: %s", e)
             else:
                 logging.exception("edit_message_text error")
                 raise
+        finally:
+            edit.release()
 
     async def send_message(
         self, chat_id: int | str, text: str, *args: object, **kwargs: object
     ) -> None:
+        sent = None
         try:
             messages = split_text(text)
             for msg in messages:
-                sent = await super().send_message(chat_id, msg, *args, **kwargs)
+                options = dict(kwargs)
+                rendered = self.render_markdown(msg, options)
+                sent = await self.throttled(
+                    chat_id, super().send_message, chat_id, rendered, *args, **options
+                )
+                if message_id := getattr(sent, "message_id", None):
+                    self.edits.remember(
+                        (chat_id, message_id),
+                        *fingerprint({"text": rendered, **options}),
+                    )
         except ApiTelegramException as e:
             if "MESSAGE_TOO_LONG" in str(e):
                 logging.warning("send_message error: %s", e)
             elif "can't parse entities" in str(e):
+                metrics.incr("bot.outbound.parse_fallback")
                 kwargs["parse_mode"] = ""
                 await self.send_message(chat_id, text, *args, **kwargs)
                 logging.warning("send_message error: %s", e)
@@ -80,22 +208,133 @@ class BaseBot(AsyncTeleBot):
                 raise
         return sent
 
-    async def get_file_telethon(self, chat_id: int, message_id: int) -> BytesIO:
+    async def edit_message_reply_markup(
+        self, *args: object, **kwargs: object
+    ) -> object:
+        target = kwargs.get("chat_id") or kwargs.get("inline_message_id")
+        key = edit_key(
+            kwargs.get("chat_id"),
+            kwargs.get("message_id"),
+            kwargs.get("inline_message_id"),
+        )
+        _, markup = fingerprint(kwargs)
+        if key is not None and not args and self.edits.is_current(key, markup=markup):
+            metrics.incr("bot.outbound.edits_skipped")
+            return None
+
+        result = await self.throttled(
+            target, super().edit_message_reply_markup, *args, **kwargs
+        )
+        metrics.incr("bot.outbound.edits_sent")
+        if key is not None:
+            self.edits.remember(key, markup=markup)
+        return result
+
+    async def send_document(
+        self, chat_id: int | str, *args: object, **kwargs: object
+    ) -> object:
+        return await self.throttled(
+            chat_id, super().send_document, chat_id, *args, **kwargs
+        )
+
+    async def send_voice(
+        self, chat_id: int | str, *args: object, **kwargs: object
+    ) -> object:
+        return await self.throttled(
+            chat_id, super().send_voice, chat_id, *args, **kwargs
+        )
+
+    async def answer_callback_query(self, *args: object, **kwargs: object) -> bool:
+        return await self.throttled(
+            None, super().answer_callback_query, *args, **kwargs
+        )
+
+    async def answer_inline_query(self, *args: object, **kwargs: object) -> bool:
+        return await self.throttled(None, super().answer_inline_query, *args, **kwargs)
+
+    def file_url(self, file_path: str) -> str:
+        if asyncio_helper.FILE_URL:
+            return asyncio_helper.FILE_URL.format(self.token, file_path)
+        if self.bot_type == "bale":
+            return f"https://tapi.bale.ai/file/bot{self.token}/{file_path}"
+        return f"https://api.telegram.org/file/bot{self.token}/{file_path}"
+
+    async def iter_file(self, file_path: str) -> AsyncGenerator[bytes]:
+        """Stream a file from the Bot API instead of reading it whole."""
+        client = HttpClients().get("bot_files")
+        response = await client.send(
+            client.build_request("GET", self.file_url(file_path)), stream=True
+        )
+        try:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(64 * 1024):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def get_telethon(self) -> "TelegramClient":
+        """Return the bot's persistent Telethon client, connecting it on demand.
+
+        Only the (re)connect is serialized; connected clients are shared by
+        all concurrent downloads.
+        """
+        client = self.telethon
+        if client is not None and client.is_connected():
+            return client
+
         from telethon import TelegramClient
 
         async with self.lock:
-            client = await TelegramClient(
-                f"sessions/{self.me}",
-                os.getenv("TELEGRAM_API_ID"),
-                os.getenv("TELEGRAM_API_HASH"),
-            ).start(bot_token=os.getenv("TELEGRAM_TOKEN"))
-            # await client.start(bot_token=self.token)
-            entity = await client.get_input_entity(chat_id)
-            msg = await client.get_messages(entity, ids=message_id)
-            if not msg:
-                raise RuntimeError("Message not found or deleted.")
-
-            return msg.media
+            if self.telethon is None:
+                self.telethon = TelegramClient(
+                    f"sessions/{self.me}",
+                    Settings.telegram_api_id,
+                    Settings.telegram_api_hash,
+                    auto_reconnect=True,
+                )
+            if not self.telethon.is_connected():
+                await self.telethon.start(bot_token=self.token)
+                logging.info("telethon client connected for %s", self)
+            return self.telethon
+
+    async def disconnect_telethon(self) -> None:
+        client, self.telethon = self.telethon, None
+        if client is not None:
+            await client.disconnect()
+
+    async def iter_file_telethon(
+        self, chat_id: int, message_id: int
+    ) -> AsyncGenerator[bytes]:
+        """Stream a message's media, in parallel parts for large files."""
+        client = await self.get_telethon()
+        entity = await client.get_input_entity(chat_id)
+        msg = await client.get_messages(entity, ids=message_id)
+        if not msg or not msg.media:
+            raise RuntimeError("Message not found or deleted.")
+
+        size = msg.file.size or 0
+        if size < Settings.telethon_parallel_threshold:
+            chunks = client.iter_download(msg.media, file_size=size or None)
+        else:
+            chunks = iter_parallel_download(
+                client,
+                msg.media,
+                size,
+                part_size=Settings.telethon_part_size,
+                parallelism=Settings.telethon_parallelism,
+            )
+        async for chunk in chunks:
+            yield bytes(chunk)
+
+    async def get_file_telethon(
+        self, chat_id: int, message_id: int, file_name: str | None = None
+    ) -> BytesIO:
+        file = BytesIO()
+        async for chunk in self.iter_file_telethon(chat_id, message_id):
+            file.write(chunk)
+        file.seek(0)
+        file.name = file_name or f"{message_id}"
+        return file
 
 
 class TelegramBot(BaseBot, metaclass=singleton.Singleton):
@@ -1,13 +1,28 @@
+import asyncio
+import logging
 import uuid
 from io import BytesIO
 
 from fastapi_mongo_base.utils import basic
 from telebot import async_telebot
 
-from apps.accounts.handlers import get_user_profile, get_usso_user
+from apps.accounts.handlers import (
+    get_user_profile,
+    get_usso_user,
+    invalidate_user_profile,
+)
 from apps.ai import ocr
-from apps.bots import base_bot, keyboards, models, schemas, services
-from utils import texttools
+from apps.bots import (
+    albums,
+    base_bot,
+    keyboards,
+    media_cache,
+    models,
+    schemas,
+    services,
+)
+from server.config import Settings
+from utils import media, metrics, texttools
 
 command_key = {
     "/start": "start",
@@ -75,39 +90,66 @@ async def prompt(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
     )
 
 
-async def voice(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
-    from utils import media
+async def transcribe_voice(
+    message: schemas.MessageOwned,
+    bot: base_bot.BaseBot,
+    response: schemas.MessageOwned,
+) -> str:
+    audio_file = message.voice or message.audio
+    with metrics.timer("voice.download"):
+        voice_file = await media_cache.read(bot, message, audio_file)
+    if Settings.voice_archive:
+        media.archive_file(voice_file, f"{audio_file.file_unique_id}.ogg")
+
+    async def show_partial(text: str) -> None:
+        await bot.edit_message_text(
+            text=f"{text} …",
+            chat_id=message.chat.id,
+            message_id=response.message_id,
+            parse_mode="",
+        )
 
-    response: schemas.MessageOwned = await bot.reply_to(
-        message, "Please wait voice ..."
-    )
-    voice_info = await bot.get_file(message.voice.file_id)
-    voice_file = await bot.download_file(voice_info.file_path)
     voice_bytes = BytesIO(voice_file)
-    remote_file_url = await media.upload_file(
-        voice_bytes, file_name=message.document.file_name
+    voice_bytes.name = getattr(audio_file, "file_name", None) or "voice.ogg"
+    with metrics.timer("voice.stt"):
+        transcription = await services.stt_response(
+            voice_bytes, duration=audio_file.duration, on_partial=show_partial
+        )
+    await media_cache.save_result(
+        audio_file.file_unique_id, "transcription", transcription
     )
+    return transcription
 
-    # voice_bytes.name = "voice.ogg"
-    transcription = await services.stt_response(remote_file_url)
 
-    msg = models.Message(user_id=message.user.uid, content=transcription)
-    await msg.save()
+async def voice(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
+    response: schemas.MessageOwned = await bot.reply_to(
+        message, "Please wait voice ..."
+    )
+    audio_file = message.voice or message.audio
+    transcription = await media_cache.get_result(
+        audio_file.file_unique_id, "transcription"
+    )
+    if transcription is None:
+        transcription = await transcribe_voice(message, bot, response)
+
+    with metrics.timer("voice.reply"):
+        msg = models.Message(user_id=message.user.uid, content=transcription)
+        await msg.save()
+
+        if message.forward_origin:
+            return await bot.edit_message_text(
+                text=transcription,
+                chat_id=message.chat.id,
+                message_id=response.message_id,
+                reply_markup=keyboards.answer_keyboard(msg.uid),
+            )
 
-    if message.forward_origin:
-        return await bot.edit_message_text(
+        await bot.edit_message_text(
             text=transcription,
             chat_id=message.chat.id,
             message_id=response.message_id,
-            reply_markup=keyboards.answer_keyboard(msg.uid),
         )
 
-    await bot.edit_message_text(
-        text=transcription,
-        chat_id=message.chat.id,
-        message_id=response.message_id,
-    )
-
     response.text = transcription
     response.user = message.user
     response.profile = message.profile
@@ -115,37 +157,107 @@ async def voice(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
 
 
 async def photo(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
-    await bot.reply_to(message, "Please wait photo ...")
-    photo_info = await bot.get_file(message.photo[-1].file_id)
-    photo_file = await bot.download_file(photo_info.file_path)
-    photo_bytes = BytesIO(photo_file)
-    photo_bytes.name = "photo.jpg"
-    await services.ocr_response(photo_bytes)
+    photo_size = services.pick_photo_size(message.photo)
+    meta_data = {
+        "chat_id": message.chat.id,
+        "bot_name": bot.me,
+        "file_unique_id": photo_size.file_unique_id,
+        "file_name": "photo.jpg",
+    }
+    ocr_uid = await media_cache.get_result(photo_size.file_unique_id, "ocr_job")
+    if ocr_uid is not None:
+        requester = ocr.MessengerMetaDataSchema.model_validate(meta_data)
+        return await ocr.OCRClient().adeliver(ocr_uid, [requester])
+
+    response_message = await bot.reply_to(message, "Please wait photo ...")
+    meta_data["message_id"] = response_message.message_id
+    photo_file = await media_cache.read(bot, message, photo_size)
+    await services.ocr_response(photo_file, meta_data, photo_size.file_unique_id)
 
 
 async def document(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
-    from utils import media
+    file_unique_id = message.document.file_unique_id
+    meta_data = {
+        "chat_id": message.chat.id,
+        # "user_id": message.user.uid,
+        "bot_name": bot.me,
+        "file_unique_id": file_unique_id,
+        "file_name": message.document.file_name,
+    }
+    ocr_uid = await media_cache.get_result(file_unique_id, "ocr_job")
+    if ocr_uid is not None:
+        requester = ocr.MessengerMetaDataSchema.model_validate(meta_data)
+        return await ocr.OCRClient().adeliver(ocr_uid, [requester])
 
     response_message = await bot.reply_to(message, "Please wait document ...")
-    # document_info = await bot.get_file(message.document.file_id)
-    # document_file = await bot.download_file(document_info.file_path)
-    document_file = await bot.get_file_telethon(
-        message.chat.id, message.message_id
-    )
-    remote_file_url = await media.upload_file(
-        document_file, file_name=message.document.file_name
+    meta_data["message_id"] = response_message.message_id
+    async with media.budget().reserve(message.document.file_size or 0):
+        chunks = bot.iter_file_telethon(message.chat.id, message.message_id)
+        with await media.spool(chunks) as document_file:
+
+            async def upload() -> str:
+                return await media_cache.upload(
+                    file_unique_id, document_file, message.document.file_name
+                )
+
+            await ocr.OCRClient().asubmit_document(document_file, meta_data, upload)
+
+
+@basic.try_except_wrapper
+async def album(messages: list[schemas.MessageOwned], bot: base_bot.BaseBot) -> None:
+    """Read every photo and document of an album and reply with one result."""
+    first = messages[0]
+    response_message = await bot.reply_to(
+        first, f"Please wait, reading {len(messages)} files ..."
     )
-    await ocr.OCRClient().asubmit_ocr_task(
-        remote_file_url,
-        {
-            "message_id": response_message.message_id,
-            "chat_id": message.chat.id,
-            # "user_id": message.user.uid,
-            "bot_name": bot.me,
-        },
+    meta_data = {
+        "chat_id": first.chat.id,
+        "bot_name": bot.me,
+        "message_id": response_message.message_id,
+        "file_name": "album",
+    }
+    client = ocr.OCRClient()
+    album_id = await client.acreate_album(meta_data, len(messages))
+
+    async def submit(index: int, message: schemas.MessageOwned) -> None:
+        file = message.document or services.pick_photo_size(message.photo)
+        file_name = getattr(file, "file_name", None) or f"photo_{index + 1}.jpg"
+        part = {
+            **meta_data,
+            "file_unique_id": file.file_unique_id,
+            "file_name": file_name,
+            "album_id": album_id,
+            "album_index": index,
+        }
+        try:
+            if message.photo:
+                photo_file = await media_cache.read(bot, message, file)
+                return await services.ocr_response(
+                    photo_file, part, file.file_unique_id
+                )
+            path = await media_cache.download(bot, message, file)
+            with await asyncio.to_thread(path.open, "rb") as content:
+
+                async def upload() -> str:
+                    return await media_cache.upload(
+                        file.file_unique_id, content, file_name
+                    )
+
+                await client.asubmit_document(content, part, upload)
+        except Exception:
+            logging.exception("reading album part %s failed", file_name)
+            # the other parts are still sent
+            requester = ocr.MessengerMetaDataSchema.model_validate(part)
+            await client.arecord_album_part(requester, None)
+
+    await asyncio.gather(
+        *(submit(index, message) for index, message in enumerate(messages))
     )
 
 
+album_collector = albums.AlbumCollector(album)
+
+
 async def url_response(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
     response = await bot.reply_to(message, "Please wait url ...", reply_markup=None)
     await services.url_response(
@@ -159,18 +271,20 @@ async def url_response(message: schemas.MessageOwned, bot: base_bot.BaseBot) ->
 
 @basic.try_except_wrapper
 async def message(message: schemas.MessageOwned, bot: base_bot.BaseBot) -> None:
+    if message.media_group_id and (message.photo or message.document):
+        return album_collector.add(message, bot)
     if message.document:
         return await document(message, bot)
-    if message.voice:
+    if message.voice or message.audio:
         return await voice(message, bot)
+    if message.photo:
+        return await photo(message, bot)
     if (
         message.text.startswith("/")
         or message.text in command_key
         or message.text in command_key.values()
     ):
         return await command(message, bot)
-    if message.photo:
-        return await photo(message, bot)
 
     if texttools.is_valid_url(message.text):
         return await url_response(message, bot)
@@ -185,8 +299,7 @@ async def callback_read(
     message: models.Message = await models.Message.get_item(
         uid=message_id, user_id=call.message.user.uid
     )
-    voice = await services.tts_response(message.content)
-    await bot.send_voice(call.message.chat.id, voice)
+    await services.send_speech(bot, call.message.chat.id, message.content)
 
 
 async def callback_answer(
@@ -208,6 +321,7 @@ async def callback_select_ai(
     profile.ai_engine = call.data.split("_")[2]
     # TODO
     profile.save()
+    invalidate_user_profile(profile.user_id, profile)
     await bot.edit_message_text(
         text="AI Engine selected",
         chat_id=call.message.chat.id,
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+import singleton
+from pymongo.errors import DuplicateKeyError
+
+from apps.bots import models
+from server.config import Settings
+from utils import metrics
+
+
+class UpdateDeduplicator(metaclass=singleton.Singleton):
+    """Remember recently seen `update_id`s so webhook retries are dropped.
+
+    The in-memory window is per process; with `UPDATE_DEDUP_BACKEND=mongo`
+    the window is shared by all workers through a unique index.
+    """
+
+    def __init__(self) -> None:
+        self.window = Settings.update_dedup_window
+        self.backend = Settings.update_dedup_backend
+        self.seen: dict[str, OrderedDict[int, None]] = {}
+
+    def _seen_locally(self, bot_route: str, update_id: int) -> bool:
+        seen = self.seen.setdefault(bot_route, OrderedDict())
+        if update_id in seen:
+            return True
+        seen[update_id] = None
+        if len(seen) > self.window:
+            seen.popitem(last=False)
+        return False
+
+    async def _seen_shared(self, bot_route: str, update_id: int) -> bool:
+        try:
+            await models.ProcessedUpdate(
+                bot_route=bot_route, update_id=update_id
+            ).insert()
+        except DuplicateKeyError:
+            return True
+        return False
+
+    async def is_duplicate(self, bot_route: str, update_dict: dict) -> bool:
+        update_id = update_dict.get("update_id")
+        if not isinstance(update_id, int):
+            return False
+
+        duplicate = self._seen_locally(bot_route, update_id)
+        if not duplicate and self.backend == "mongo":
+            duplicate = await self._seen_shared(bot_route, update_id)
+        if duplicate:
+            metrics.incr(f"updates.duplicates.{bot_route}")
+        return duplicate
+
+    async def forget(self, bot_route: str, update_dict: dict) -> None:
+        """Unmark an update that could not be queued, so its redelivery is."""
+        update_id = update_dict.get("update_id")
+        if not isinstance(update_id, int):
+            return
+
+        self.seen.get(bot_route, {}).pop(update_id, None)
+        if self.backend == "mongo":
+            await models.ProcessedUpdate.find({
+                "bot_route": bot_route,
+                "update_id": update_id,
+            }).delete()
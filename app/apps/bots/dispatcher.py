@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+
+import singleton
+
+from apps.bots.handlers import update_bot
+from server.config import Settings
+from utils import metrics
+
+UpdateHandler = Callable[[str, dict[str, object]], Awaitable[None]]
+
+
+class DispatcherClosedError(RuntimeError):
+    pass
+
+
+def chat_key(update_dict: dict) -> Hashable:
+    """Return the key updates are serialized on: the chat, else the sender."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if field in update_dict:
+            return update_dict[field].get("chat", {}).get("id")
+
+    if "callback_query" in update_dict:
+        call = update_dict["callback_query"]
+        chat_id = (call.get("message") or {}).get("chat", {}).get("id")
+        return chat_id or call.get("from", {}).get("id")
+
+    for field in ("inline_query", "chosen_inline_result"):
+        if field in update_dict:
+            return update_dict[field].get("from", {}).get("id")
+
+    return update_dict.get("update_id")
+
+
+class UpdateDispatcher:
+    """Bounded update queue processed by a fixed pool of workers.
+
+    Updates of the same chat are handled one at a time in arrival order;
+    different chats run concurrently. `submit` waits while `max_size`
+    updates are pending, which pushes back on the webhook sender.
+    """
+
+    def __init__(
+        self, handler: UpdateHandler, *, max_size: int = 1000, workers: int = 16
+    ) -> None:
+        self.handler = handler
+        self.max_size = max_size
+        self.worker_count = workers
+        self.chats: dict[Hashable, deque[tuple[str, dict, float]]] = {}
+        self.ready: asyncio.Queue[Hashable] | None = None
+        self.slots: asyncio.Semaphore | None = None
+        self.workers: list[asyncio.Task] = []
+        self.depth = 0
+        self.closed = False
+        metrics.gauge("update_queue.depth", lambda: self.depth)
+
+    def start(self) -> None:
+        if self.ready is None:
+            self.ready = asyncio.Queue()
+            self.slots = asyncio.Semaphore(self.max_size)
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.worker_count:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    async def submit(self, bot_route: str, update_dict: dict[str, object]) -> None:
+        if self.closed:
+            raise DispatcherClosedError("update dispatcher is draining")
+        self.start()
+
+        await self.slots.acquire()
+        self.depth += 1
+        key = (bot_route, chat_key(update_dict))
+        item = (bot_route, update_dict, time.perf_counter())
+        if key in self.chats:
+            self.chats[key].append(item)
+        else:
+            self.chats[key] = deque([item])
+            self.ready.put_nowait(key)
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self.ready.get()
+            pending = self.chats[key]
+            bot_route, update_dict, enqueued_at = pending[0]
+            metrics.observe("update_queue.wait", time.perf_counter() - enqueued_at)
+            try:
+                with metrics.timer("update_queue.handle"):
+                    await self.handler(bot_route, update_dict)
+            except Exception:
+                logging.exception("update handler failed for %s", bot_route)
+            finally:
+                pending.popleft()
+                self.depth -= 1
+                self.slots.release()
+                if pending:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.chats[key]
+                self.ready.task_done()
+
+    async def drain(self, grace_period: float | None = None) -> None:
+        """Stop accepting updates, finish queued ones, then stop the workers."""
+        self.closed = True
+        if self.ready is not None:
+            try:
+                await asyncio.wait_for(self.ready.join(), grace_period)
+            except TimeoutError:
+                logging.warning("update queue drain timed out, %d left", self.depth)
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+
+class BotUpdateDispatcher(UpdateDispatcher, metaclass=singleton.Singleton):
+    def __init__(self) -> None:
+        super().__init__(
+            update_bot,
+            max_size=Settings.update_queue_size,
+            workers=Settings.update_workers,
+        )
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+from utils import metrics
+
+EditKey = Hashable
+
+
+def edit_key(
+    chat_id: int | str | None = None,
+    message_id: int | None = None,
+    inline_message_id: str | None = None,
+) -> EditKey | None:
+    if inline_message_id:
+        return inline_message_id
+    if chat_id is not None and message_id is not None:
+        return (chat_id, message_id)
+    return None
+
+
+def fingerprint(options: dict) -> tuple[int, int]:
+    """Hashes of the text and of the keyboard an edit would leave behind."""
+    entities = options.get("entities") or ()
+    markup = options.get("reply_markup")
+    text = hash((
+        options.get("text"),
+        options.get("parse_mode"),
+        tuple((e.type, e.offset, e.length, e.url, e.language) for e in entities),
+    ))
+    return text, hash(markup.to_json() if markup else None)
+
+
+class EditTracker:
+    """Last known text and keyboard of recently touched messages.
+
+    Edits are compared against it before they are sent, and edits that are
+    still waiting for rate-limit budget are collapsed to the latest one.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.states: OrderedDict[EditKey, tuple[int | None, int | None]] = OrderedDict()
+        self.pending: dict[EditKey, dict] = {}
+
+    def is_current(
+        self, key: EditKey, text: int | None = None, markup: int | None = None
+    ) -> bool:
+        state = self.states.get(key)
+        if state is None:
+            return False
+        return (text is None or state[0] == text) and (
+            markup is None or state[1] == markup
+        )
+
+    def remember(
+        self, key: EditKey, text: int | None = None, markup: int | None = None
+    ) -> None:
+        old_text, old_markup = self.states.get(key, (None, None))
+        self.states[key] = (
+            old_text if text is None else text,
+            old_markup if markup is None else markup,
+        )
+        self.states.move_to_end(key)
+        while len(self.states) > self.max_size:
+            self.states.popitem(last=False)
+
+    def queue(self, key: EditKey, payload: dict) -> bool:
+        """Queue an edit; False when it needs no request of its own."""
+        if key in self.pending:
+            # an edit of this message is still waiting; it sends ours instead,
+            # and skips it then if the message already shows it
+            self.pending[key] = payload
+            metrics.incr("bot.outbound.edits_coalesced")
+            return False
+        if self.is_current(key, *fingerprint(payload)):
+            metrics.incr("bot.outbound.edits_skipped")
+            return False
+        self.pending[key] = payload
+        return True
+
+
+class QueuedEdit:
+    """Send the latest payload queued for a message once budget allows."""
+
+    def __init__(
+        self,
+        tracker: EditTracker,
+        key: EditKey | None,
+        payload: dict,
+        method: Callable[..., Awaitable[object]],
+    ) -> None:
+        self.tracker = tracker
+        self.key = key
+        self.payload = payload
+        self.method = method
+        self.taken = key is None
+
+    async def __call__(self) -> object:
+        if not self.taken:
+            self.payload = self.tracker.pending.pop(self.key, self.payload)
+            self.taken = True
+        fingerprints = fingerprint(self.payload)
+        if self.key is not None and self.tracker.is_current(self.key, *fingerprints):
+            metrics.incr("bot.outbound.edits_skipped")
+            return None
+
+        result = await self.method(**self.payload)
+        metrics.incr("bot.outbound.edits_sent")
+        if self.key is not None:
+            self.tracker.remember(self.key, *fingerprints)
+        return result
+
+    def release(self) -> None:
+        if not self.taken:
+            self.tracker.pending.pop(self.key, None)
@@ -1,37 +1,104 @@
+import asyncio
 import logging
+from collections.abc import Callable
 
 import singleton
 from fastapi_mongo_base.utils import basic
 from telebot import async_telebot
 
-from apps.bots import base_bot, middlewares
+from apps.bots import base_bot, middlewares, models
 from server.config import Settings
 
-from .bot_actions import callback, inline_query, inline_query_ai, message
+from .bot_actions import (
+    album_collector,
+    callback,
+    inline_query,
+    inline_query_ai,
+    message,
+)
 
 
-def get_bot(bot_name: str) -> base_bot.BaseBot:
-    for bot_cls in basic.get_all_subclasses(base_bot.BaseBot):
-        bot: base_bot.BaseBot = bot_cls()
-        if bot.me == bot_name:
+class BotRegistry(metaclass=singleton.Singleton):
+    """Bots indexed by name (`me`) and webhook route, built on first use."""
+
+    def __init__(self) -> None:
+        self.factories: dict[str, Callable[[], base_bot.BaseBot]] = {}
+        self.routes: dict[str, str] = {}
+        self.bots: dict[str, base_bot.BaseBot] = {}
+        for bot_cls in basic.get_all_subclasses(base_bot.BaseBot):
+            if bot_cls.me:
+                self.register(bot_cls.me, bot_cls.webhook_route, bot_cls)
+
+    def register(
+        self, name: str, route: str, factory: Callable[[], base_bot.BaseBot]
+    ) -> None:
+        self.unregister(name)
+        self.factories[name] = factory
+        self.routes[route or name] = name
+
+    def register_token(self, token: str, name: str, route: str | None = None) -> None:
+        def factory() -> base_bot.BaseBot:
+            bot = base_bot.BaseBot(token)
+            bot.me = name
+            bot.webhook_route = route or name
             return bot
-    else:
+
+        self.register(name, route or name, factory)
+
+    def unregister(self, name: str) -> base_bot.BaseBot | None:
+        self.factories.pop(name, None)
+        self.routes = {
+            route: bot_name
+            for route, bot_name in self.routes.items()
+            if bot_name != name
+        }
+        return self.bots.pop(name, None)
+
+    def get(self, name: str) -> base_bot.BaseBot | None:
+        bot = self.bots.get(name)
+        if bot is None and name in self.factories:
+            bot = self.factories[name]()
+            BotHandler().register_handlers(bot)
+            self.bots[name] = bot
+        return bot
+
+    def get_by_route(self, route: str) -> base_bot.BaseBot | None:
+        name = self.routes.get(route)
+        return self.get(name) if name else None
+
+    def class_bots(self) -> list[base_bot.BaseBot]:
+        return [
+            self.get(name)
+            for name, factory in self.factories.items()
+            if isinstance(factory, type)
+        ]
+
+    async def load_tenant_bots(self) -> None:
+        async for tenant_bot in models.TenantBot.find({"is_deleted": False}):
+            self.register_token(
+                tenant_bot.token, tenant_bot.name, tenant_bot.webhook_route
+            )
+
+
+def get_bot(bot_name: str) -> base_bot.BaseBot:
+    bot = BotRegistry().get(bot_name)
+    if bot is None:
         logging.error("base_bot not found by name: %s", bot_name)
         raise ValueError("base_bot not found by name")
+    return bot
 
 
 def get_bot_by_route(bot_route: str) -> base_bot.BaseBot:
-    for bot_cls in basic.get_all_subclasses(base_bot.BaseBot):
-        bot: base_bot.BaseBot = bot_cls()
-        if bot.webhook_route == bot_route:
-            return bot
-    else:
+    bot = BotRegistry().get_by_route(bot_route)
+    if bot is None:
         logging.error("base_bot not found by route: %s", bot_route)
         raise ValueError("base_bot not found by route")
+    return bot
 
 
 class BotHandler(metaclass=singleton.Singleton):
     is_setup = False
+    identity_refresher: asyncio.Task | None = None
 
     # def __init__(self):
     #     asyncio.run(self.setup())
@@ -40,14 +107,44 @@ class BotHandler(metaclass=singleton.Singleton):
         if self.is_setup:
             return
 
-        for bot_cls in basic.get_all_subclasses(base_bot.BaseBot):
-            bot: base_bot.BaseBot = bot_cls()
-
+        registry = BotRegistry()
+        for bot in registry.class_bots():
             await self.setup_webhook(bot)
             await self.setup_bot(bot)
+        await registry.load_tenant_bots()
 
+        self.identity_refresher = asyncio.create_task(self.refresh_identities())
         self.is_setup = True
 
+    async def add_bot(
+        self, token: str, name: str, route: str | None = None
+    ) -> base_bot.BaseBot:
+        """Register a bot at runtime and point its webhook at this server."""
+        registry = BotRegistry()
+        registry.register_token(token, name, route)
+        bot = registry.get(name)
+        await self.setup_webhook(bot)
+        await self.setup_bot(bot)
+        return bot
+
+    async def refresh_identities(self) -> None:
+        while True:
+            await asyncio.sleep(Settings.bot_identity_refresh_interval)
+            for bot in list(BotRegistry().bots.values()):
+                try:
+                    await bot.refresh_identity()
+                except Exception:
+                    logging.exception("refreshing identity of %s failed", bot)
+
+    async def drain_albums(self, grace_period: float | None = None) -> None:
+        await album_collector.drain(grace_period=grace_period)
+
+    async def shutdown(self) -> None:
+        if self.identity_refresher:
+            self.identity_refresher.cancel()
+        for bot in list(BotRegistry().bots.values()):
+            await bot.disconnect_telethon()
+
     async def setup_webhook(self, bot: base_bot.BaseBot) -> None:
         from apps.bots import routes
 
@@ -60,6 +157,10 @@ class BotHandler(metaclass=singleton.Singleton):
             logging.info("set webhook for %s with result: %s", bot, res)
 
     async def setup_bot(self, bot: base_bot.BaseBot) -> None:
+        await bot.refresh_identity()
+        logging.info("bot %s resolved as %s", bot.me, bot.identity)
+
+    def register_handlers(self, bot: base_bot.BaseBot) -> None:
         middleware = middlewares.UserMiddleware(bot)
         bot.setup_middleware(middleware)
         bot.register_callback_query_handler(
@@ -92,10 +193,7 @@ async def update_bot(
 
 
 def main() -> None:
-    import asyncio
-
-    BotHandler()
-    bot = base_bot.TelegramBot()
+    bot = get_bot(base_bot.TelegramBot.me)
     asyncio.run(bot.delete_webhook())
     asyncio.run(bot.polling())
 
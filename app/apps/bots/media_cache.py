@@ -0,0 +1,104 @@
+"""Reuse downloads, uploads and results of files Telegram has seen before.
+
+Everything is keyed by `file_unique_id`, which stays the same when a file
+is forwarded or sent to another bot, so a viral voice note or PDF is
+downloaded, uploaded and processed once.
+"""
+
+import asyncio
+import contextlib
+import functools
+from pathlib import Path
+from typing import BinaryIO
+
+from pymongo.errors import DuplicateKeyError
+from telebot import types
+
+from apps.bots import base_bot, models
+from server.config import Settings
+from utils import media, metrics
+from utils.file_cache import FileCache
+
+BOT_API_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+
+@functools.cache
+def media_files() -> FileCache:
+    return FileCache(
+        "media", Settings.media_cache_dir, max_bytes=Settings.media_cache_max_bytes
+    )
+
+
+async def _find(file_unique_id: str) -> models.TelegramFile | None:
+    return await models.TelegramFile.find_one({"file_unique_id": file_unique_id})
+
+
+async def _record(
+    file_unique_id: str, changes: dict[str, object], **fields: object
+) -> None:
+    """Apply `changes` to the file's entry, or create it with `fields`."""
+    # a concurrent insert of the same file wins; both carry the same content
+    with contextlib.suppress(DuplicateKeyError):
+        await models.TelegramFile.find_one({"file_unique_id": file_unique_id}).upsert(
+            {"$set": changes},
+            on_insert=models.TelegramFile(file_unique_id=file_unique_id, **fields),
+        )
+
+
+async def download(
+    bot: base_bot.BaseBot,
+    message: types.Message,
+    file: types.Voice | types.Audio | types.Document | types.PhotoSize,
+) -> Path:
+    """Path of `file` on disk, downloading it the first time.
+
+    The download streams to disk within the media byte budget; files over
+    the Bot API download limit are fetched with Telethon.
+    """
+
+    async def fill(path: Path) -> None:
+        async with media.budget().reserve(file.file_size or 0):
+            if (file.file_size or 0) > BOT_API_DOWNLOAD_LIMIT:
+                chunks = bot.iter_file_telethon(message.chat.id, message.message_id)
+            else:
+                file_info = await bot.get_file(file.file_id)
+                chunks = bot.iter_file(file_info.file_path)
+            async with contextlib.aclosing(chunks):
+                with await asyncio.to_thread(path.open, "wb") as output:
+                    async for chunk in chunks:
+                        await asyncio.to_thread(output.write, chunk)
+
+    return await media_files().get(file.file_unique_id, fill)
+
+
+async def read(
+    bot: base_bot.BaseBot,
+    message: types.Message,
+    file: types.Voice | types.Audio | types.Document | types.PhotoSize,
+) -> bytes:
+    path = await download(bot, message, file)
+    return await asyncio.to_thread(path.read_bytes)
+
+
+async def upload(file_unique_id: str, file: BinaryIO, file_name: str) -> str:
+    """Public URL of the file, uploading `file` the first time."""
+    entry = await _find(file_unique_id)
+    metrics.lookup("media_cache.url", found=bool(entry and entry.url))
+    if entry and entry.url:
+        return entry.url
+
+    url = await media.upload_file(file, file_name=file_name)
+    await _record(file_unique_id, {"url": url}, url=url)
+    return url
+
+
+async def get_result(file_unique_id: str, kind: str) -> str | None:
+    """An earlier `kind` result (e.g. "transcription") for the file, if any."""
+    entry = await _find(file_unique_id)
+    result = entry.results.get(kind) if entry else None
+    metrics.lookup(f"media_cache.{kind}", found=result is not None)
+    return result
+
+
+async def save_result(file_unique_id: str, kind: str, result: str) -> None:
+    await _record(file_unique_id, {f"results.{kind}": result}, results={kind: result})
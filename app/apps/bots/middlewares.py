@@ -23,7 +23,7 @@ class UserMiddleware(async_telebot.BaseMiddleware):
     ) -> None:
         messenger = self.bot_type
         from_user = message.from_user if message.from_user else message.chat
-        if from_user.id == (await self.bot.get_me()).id:
+        if from_user.id == (await self.bot.get_identity()).id:
             from_user = message.chat
 
         credentials = {
@@ -1,5 +1,68 @@
-from fastapi_mongo_base.models import UserOwnedEntity
+from typing import ClassVar
+
+from fastapi_mongo_base.models import BaseEntity, UserOwnedEntity
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from server import config
 
 
 class Message(UserOwnedEntity):
     content: str = ""
+
+
+class TenantBot(BaseEntity):
+    """A bot token served by this process in addition to the class-defined bots."""
+
+    token: str
+    name: str
+    webhook_route: str | None = None
+
+
+class ProcessedUpdate(BaseEntity):
+    bot_route: str
+    update_id: int
+
+    class Settings(BaseEntity.Settings):
+        indexes: ClassVar[list[IndexModel]] = [
+            *BaseEntity.Settings.indexes,
+            IndexModel(
+                [("bot_route", ASCENDING), ("update_id", ASCENDING)], unique=True
+            ),
+            IndexModel(
+                [("created_at", ASCENDING)],
+                expireAfterSeconds=config.Settings.update_dedup_ttl,
+            ),
+        ]
+
+
+class SpeechFile(BaseEntity):
+    """Telegram `file_id` of synthesized speech uploaded by one bot."""
+
+    key: str
+    bot_id: str
+    file_id: str
+
+    class Settings(BaseEntity.Settings):
+        indexes: ClassVar[list[IndexModel]] = [
+            *BaseEntity.Settings.indexes,
+            IndexModel([("key", ASCENDING), ("bot_id", ASCENDING)], unique=True),
+        ]
+
+
+class TelegramFile(BaseEntity):
+    """Upload URL and processing results of a file, by its `file_unique_id`.
+
+    `file_unique_id` is the same for every bot and every forward of a file,
+    so one entry serves all of them.
+    """
+
+    file_unique_id: str
+    url: str | None = None
+    results: dict[str, str] = Field(default_factory=dict)
+
+    class Settings(BaseEntity.Settings):
+        indexes: ClassVar[list[IndexModel]] = [
+            *BaseEntity.Settings.indexes,
+            IndexModel([("file_unique_id", ASCENDING)], unique=True),
+        ]
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter
+from fastapi_mongo_base.core.exceptions import BaseHTTPException
 
-from apps.bots.handlers import update_bot
+from apps.bots.dedup import UpdateDeduplicator
+from apps.bots.dispatcher import BotUpdateDispatcher, DispatcherClosedError
 
 router = APIRouter(prefix="/bots", tags=["Bots"])
 
 
 @router.post("/webhook/{bot}")
-async def bot_update(
-    bot: str, data: dict[str, object], background_tasks: BackgroundTasks
-) -> None:
-    background_tasks.add_task(update_bot, bot, data)
+async def bot_update(bot: str, data: dict[str, object]) -> None:
+    deduplicator = UpdateDeduplicator()
+    if await deduplicator.is_duplicate(bot, data):
+        return
+
+    try:
+        await BotUpdateDispatcher().submit(bot, data)
+    except DispatcherClosedError as e:
+        # Telegram redelivers it, to this worker or another
+        await deduplicator.forget(bot, data)
+        raise BaseHTTPException(503, "shutting_down", detail=str(e)) from e
+    except Exception:
+        await deduplicator.forget(bot, data)
+        raise
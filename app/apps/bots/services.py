@@ -1,39 +1,39 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import logging
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO
 
-import httpx
 import openai
+from pymongo.errors import DuplicateKeyError
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
 
 from apps.accounts.schemas import Profile
-from apps.bots import handlers
+from apps.ai import ocr
+from apps.bots import base_bot, handlers, media_cache, models
+from apps.bots.streaming import StreamingReply
 from server.config import Settings
+from utils import audio, images, metrics
+from utils.file_cache import FileCache
+from utils.http_clients import HttpClients
+from utils.texttools import split_text
 
 
 def get_openai() -> openai.AsyncOpenAI:
-    proxy_url = getattr(Settings, "PROXY", None)
-
-    if proxy_url:
-        proxies = {
-            "http": proxy_url,
-            "https": proxy_url,
-        }
-        httpx.AsyncClient(proxies=proxies)
-    else:
-        httpx.AsyncClient()
-
-        # client = openai.AsyncOpenAI(
-        #     api_key=openai.api_key, http_client=http_client
-        # )
-        client = openai.AsyncOpenAI(
-            # base_url="https://api.avalai.ir/v1", api_key=Settings.AVVALAI_API_KEY
-            # base_url="https://api.metisai.ir/openai/v1",
-            base_url="https://openrouter.ai/api/v1",
-            api_key=Settings.openrouter_api_key,
-        )
-
-    return client
+    return openai.AsyncOpenAI(
+        base_url=Settings.openrouter_base_url,
+        api_key=Settings.openrouter_api_key,
+        http_client=HttpClients().get("openrouter"),
+    )
 
 
-def ai_response(
+async def ai_response(
     *,
     message: str,
     profile: Profile,
@@ -42,29 +42,289 @@ def ai_response(
     inline_message_id: str | None = None,
     bot_name: str = "telegram",
     **kwargs: object,
-) -> None:
-    handlers.get_bot(bot_name)
+) -> str:
+    bot = handlers.get_bot(bot_name)
+    model = getattr(profile, "ai_engine", None) or Settings.llm_model
 
+    async with StreamingReply(
+        bot,
+        chat_id=chat_id,
+        message_id=response_id,
+        inline_message_id=inline_message_id,
+    ) as reply:
+        stream = await get_openai().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": message}],
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices:
+                reply.feed(chunk.choices[0].delta.content or "")
 
-async def stt_response(voice_bytes: BytesIO, **kwargs: object) -> str:
-    client = get_openai()
-    if not voice_bytes.name:
-        voice_bytes.name = "voice.ogg"
+    return reply.answer
+
+
+async def _transcribe(client: openai.AsyncOpenAI, audio_file: BytesIO) -> str:
     transcription = await client.audio.transcriptions.create(
-        model="openai/whisper-1", file=voice_bytes
+        model="openai/whisper-1", file=audio_file
     )
     return transcription.text
 
 
-async def tts_response(text: str, **kwargs: object) -> BytesIO:
+async def stt_response(
+    voice_bytes: BytesIO,
+    *,
+    duration: float | None = None,
+    on_partial: Callable[[str], Awaitable[None]] | None = None,
+    **kwargs: object,
+) -> str:
+    """Transcribe `voice_bytes`, in parallel segments when it is long.
+
+    Segments are transcribed concurrently (at most `STT_CONCURRENCY` at a
+    time) and stitched in order; `on_partial` receives the stitched text
+    each time the next segment in order is ready. Audio known by its
+    `duration` to fit one segment, or that ffmpeg cannot cut (e.g. MP4
+    with its index at the end), is transcribed in one request.
+    """
     client = get_openai()
+    if not getattr(voice_bytes, "name", None):
+        voice_bytes.name = "voice.ogg"
+
+    data = voice_bytes.getvalue()
+    length = Settings.stt_segment_seconds
+    spans = None
+    if duration is None or duration > length + length / 4:
+        try:
+            spans = await audio.plan_audio(
+                data, length=length, overlap=Settings.stt_segment_overlap
+            )
+        except audio.AudioError:
+            logging.warning("planning %s failed", voice_bytes.name, exc_info=True)
+            metrics.incr("stt.segment_fallback")
+    if not spans:
+        return await _transcribe(client, voice_bytes)
+
+    semaphore = asyncio.Semaphore(Settings.stt_concurrency)
+
+    async def transcribe_segment(index: int, start: float, end: float) -> str:
+        async with semaphore:
+            segment = BytesIO(await audio.cut_segment(data, start, end))
+            segment.name = f"segment-{index}.ogg"
+            with metrics.timer("stt.segment"):
+                return await _transcribe(client, segment)
 
-    response = await client.audio.speech.create(
-        model="tts-1", voice="alloy", input=text
+    tasks = [
+        asyncio.create_task(transcribe_segment(i, start, end))
+        for i, (start, end) in enumerate(spans)
+    ]
+    metrics.incr("stt.segmented")
+    stitcher = audio.Stitcher()
+    try:
+        for i, task in enumerate(tasks):
+            text = stitcher.add(await task)
+            if on_partial and i < len(tasks) - 1:
+                await on_partial(text)
+    except audio.AudioError:
+        logging.warning("cutting %s failed", voice_bytes.name, exc_info=True)
+        metrics.incr("stt.segment_fallback")
+        return await _transcribe(client, voice_bytes)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return stitcher.text
+
+
+def speech_key(text: str, model: str, voice: str) -> str:
+    return hashlib.sha256(f"{model}\0{voice}\0{text}".encode()).hexdigest()
+
+
+@functools.cache
+def speech_files() -> FileCache:
+    return FileCache(
+        "tts", Settings.tts_cache_dir, max_bytes=Settings.tts_cache_max_bytes
     )
 
-    buffer = BytesIO()
-    for data in response.response.iter_bytes():
-        buffer.write(data)
-    buffer.seek(0)
-    return buffer
+
+async def _synthesize(
+    client: openai.AsyncOpenAI, text: str, model: str, voice: str
+) -> AsyncGenerator[bytes]:
+    with metrics.timer("tts.synthesize"):
+        async with client.audio.speech.with_streaming_response.create(
+            model=model, voice=voice, input=text, response_format="opus"
+        ) as response:
+            async for data in response.iter_bytes():
+                yield data  # noqa: ASYNC119 callers close it with aclosing
+
+
+def _synthesize_segments(
+    segments: list[str], model: str, voice: str
+) -> list[asyncio.Task[bytes]]:
+    """Start synthesizing `segments`, at most `TTS_CONCURRENCY` at a time."""
+    client = get_openai()
+    semaphore = asyncio.Semaphore(Settings.tts_concurrency)
+
+    async def synthesize(segment: str) -> bytes:
+        async with semaphore:
+            chunks = _synthesize(client, segment, model, voice)
+            async with contextlib.aclosing(chunks):
+                return b"".join([chunk async for chunk in chunks])
+
+    return [asyncio.create_task(synthesize(segment)) for segment in segments]
+
+
+async def _gather_in_order(tasks: list[asyncio.Task[bytes]]) -> list[bytes]:
+    try:
+        return [await task for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _speech_segments(text: str) -> list[str]:
+    """`text` split at sentences, or whole when ffmpeg cannot join the parts."""
+    if not audio.ffmpeg_available():
+        return [text]
+    return split_text(text, Settings.tts_segment_chars)
+
+
+async def tts_response(
+    text: str,
+    *,
+    model: str = Settings.tts_model,
+    voice: str = Settings.tts_voice,
+    **kwargs: object,
+) -> Path:
+    """Path of the OGG/Opus speech for `text`, synthesized once per content.
+
+    Texts longer than `TTS_SEGMENT_CHARS` are split at sentence boundaries
+    and the segments synthesized concurrently, when ffmpeg is available.
+    """
+
+    async def fill(path: Path) -> None:
+        segments = _speech_segments(text)
+        if len(segments) > 1:
+            parts = await _gather_in_order(_synthesize_segments(segments, model, voice))
+            await audio.write_ogg(path, parts)
+            return
+        chunks = _synthesize(get_openai(), text, model, voice)
+        async with contextlib.aclosing(chunks):
+            with await asyncio.to_thread(path.open, "wb") as audio_file:
+                async for chunk in chunks:
+                    await asyncio.to_thread(audio_file.write, chunk)
+
+    return await speech_files().get(speech_key(text, model, voice), fill)
+
+
+async def _send_segmented_speech(
+    bot: base_bot.BaseBot,
+    chat_id: int | str,
+    key: str,
+    segments: list[str],
+    model: str,
+    voice: str,
+) -> None:
+    """Send the first segment as soon as it is ready and the rest after it."""
+    started = time.perf_counter()
+    tasks = _synthesize_segments(segments, model, voice)
+    try:
+        first = await tasks[0]
+        await bot.send_voice(chat_id, BytesIO(first))
+        metrics.observe("tts.first_audio", time.perf_counter() - started)
+        rest = await _gather_in_order(tasks[1:])
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    await bot.send_voice(chat_id, BytesIO(await audio.concat_ogg(rest)))
+
+    # the next read uploads the whole text as one voice note
+    async def fill(path: Path) -> None:
+        await audio.write_ogg(path, [first, *rest])
+
+    await speech_files().get(key, fill)
+
+
+def _is_invalid_file(error: ApiTelegramException) -> bool:
+    """Whether Telegram rejected the file_id itself, not the chat or rate."""
+    return error.error_code == 400 and "file" in error.description.lower()
+
+
+async def _open_speech(text: str, model: str, voice: str) -> BinaryIO:
+    """Open the speech file for `text`.
+
+    A concurrent fill may evict it between the lookup and the open; it is
+    synthesized again then.
+    """
+    path = await tts_response(text, model=model, voice=voice)
+    try:
+        return await asyncio.to_thread(path.open, "rb")
+    except FileNotFoundError:
+        metrics.incr("tts.evicted_before_send")
+        path = await tts_response(text, model=model, voice=voice)
+        return await asyncio.to_thread(path.open, "rb")
+
+
+async def send_speech(
+    bot: base_bot.BaseBot,
+    chat_id: int | str,
+    text: str,
+    *,
+    model: str = Settings.tts_model,
+    voice: str = Settings.tts_voice,
+) -> None:
+    """Send `text` as a voice message, re-using this bot's earlier upload."""
+    key = speech_key(text, model, voice)
+    bot_id = bot.token.split(":")[0]
+    uploaded = await models.SpeechFile.find_one({"key": key, "bot_id": bot_id})
+    if uploaded:
+        try:
+            await bot.send_voice(chat_id, uploaded.file_id)
+        except ApiTelegramException as e:
+            if not _is_invalid_file(e):
+                raise
+            logging.warning("cached voice %s rejected: %s", uploaded.file_id, e)
+            await uploaded.delete()
+        else:
+            metrics.incr("tts.file_id_hit")
+            return
+
+    segments = _speech_segments(text)
+    if len(segments) > 1 and key not in speech_files():
+        await _send_segmented_speech(bot, chat_id, key, segments, model, voice)
+        return
+
+    started = time.perf_counter()
+    with await _open_speech(text, model, voice) as voice_file:
+        sent = await bot.send_voice(chat_id, voice_file)
+    metrics.observe("tts.first_audio", time.perf_counter() - started)
+    if getattr(sent, "voice", None):
+        with contextlib.suppress(DuplicateKeyError):
+            await models.SpeechFile(
+                key=key, bot_id=bot_id, file_id=sent.voice.file_id
+            ).insert()
+
+
+def pick_photo_size(sizes: list[types.PhotoSize]) -> types.PhotoSize:
+    """The smallest variant of a photo that still reaches `OCR_IMAGE_SIDE`.
+
+    Telegram keeps each photo at several resolutions; anything above what
+    the OCR needs is only more bytes to download, prepare and upload.
+    """
+    by_area = sorted(sizes, key=lambda size: size.width * size.height)
+    for size in by_area:
+        if max(size.width, size.height) >= Settings.ocr_image_side:
+            return size
+    return by_area[-1]
+
+
+async def ocr_response(photo: bytes, meta_data: dict, file_unique_id: str) -> None:
+    """Submit `photo` for OCR after preparing it locally with `images.prepare`.
+
+    Preparing is deterministic, so the same photo still shares one OCR job.
+    """
+    prepared = BytesIO(await images.prepare(photo))
+
+    async def upload() -> str:
+        return await media_cache.upload(file_unique_id, prepared, "photo.jpg")
+
+    await ocr.OCRClient().asubmit_document(prepared, meta_data, upload)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from types import TracebackType
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from apps.bots import base_bot
+from server.config import Settings
+from utils import metrics
+from utils.texttools import split_text
+
+MESSAGE_LIMIT = 4096
+
+
+class StreamingReply:
+    """Mirror a streamed answer into a placeholder message.
+
+    Deltas are appended with `feed`; a background editor pushes the latest
+    text at most once per interval. The interval starts at
+    `STREAM_EDIT_INTERVAL` (longer in groups), doubles when Telegram
+    answers 429 and decays back after successful edits. Intermediate edits
+    are plain text; leaving the context sends the final text with the bot's
+    parse mode.
+    Text past 4096 characters rolls over into new messages, except for
+    inline messages, which cannot grow and keep the first 4096 characters.
+    """
+
+    def __init__(
+        self,
+        bot: base_bot.BaseBot,
+        *,
+        chat_id: int | str | None = None,
+        message_id: int | None = None,
+        inline_message_id: str | None = None,
+    ) -> None:
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.inline_message_id = inline_message_id
+
+        is_group = isinstance(chat_id, int) and chat_id < 0
+        self.min_interval = Settings.stream_edit_interval * (3 if is_group else 1)
+        self.interval = self.min_interval
+
+        self.answer = ""
+        self.current = ""
+        self.shown = ""
+        self.changed = asyncio.Event()
+        self.editor: asyncio.Task | None = None
+        self.started_at = time.perf_counter()
+        self.first_token_at: float | None = None
+        self.first_visible_at: float | None = None
+
+    async def __aenter__(self) -> "StreamingReply":
+        self.editor = asyncio.create_task(self._edit_loop())
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self.editor:
+            self.editor.cancel()
+            await asyncio.gather(self.editor, return_exceptions=True)
+        if exc is None:
+            await self._flush(final=True)
+
+    def feed(self, delta: str) -> None:
+        if not delta:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            metrics.observe("llm.first_token", self.first_token_at - self.started_at)
+        self.answer += delta
+        self.current += delta
+        self.changed.set()
+
+    async def _edit_loop(self) -> None:
+        last_edit = 0.0
+        while True:
+            await self.changed.wait()
+            await asyncio.sleep(max(0.0, last_edit + self.interval - time.monotonic()))
+            self.changed.clear()
+            try:
+                await self._flush()
+                self.interval = max(self.min_interval, self.interval * 0.8)
+            except ApiTelegramException as e:
+                if e.error_code != 429:
+                    logging.warning("stream edit failed: %s", e)
+                    last_edit = time.monotonic()
+                    continue
+                retry_after = e.result_json.get("parameters", {}).get("retry_after", 0)
+                self.interval = min(
+                    Settings.stream_edit_max_interval,
+                    max(self.interval * 2, retry_after),
+                )
+                self.changed.set()
+                logging.warning("stream edits throttled, interval %.1fs", self.interval)
+            last_edit = time.monotonic()
+
+    async def _flush(self, final: bool = False) -> None:
+        if len(self.current) > MESSAGE_LIMIT and self.inline_message_id is None:
+            await self._roll_over()
+
+        text = self.current[:MESSAGE_LIMIT]
+        if not text or (text == self.shown and not final):
+            return
+
+        await self._edit(text, parse_mode=None if final else "")
+        self.shown = text
+        if self.first_visible_at is None:
+            self.first_visible_at = time.perf_counter()
+            metrics.observe(
+                "llm.first_visible_token", self.first_visible_at - self.started_at
+            )
+
+    async def _roll_over(self) -> None:
+        *full, rest = split_text(self.current, MESSAGE_LIMIT)
+        await self._edit(full[0], parse_mode=None)
+        for chunk in full[1:]:
+            await self.bot.send_message(self.chat_id, chunk)
+        sent = await self.bot.send_message(self.chat_id, rest, parse_mode="")
+        self.message_id = sent.message_id
+        self.current = rest
+        self.shown = rest
+        metrics.incr("llm.stream_rollovers")
+
+    async def _edit(self, text: str, parse_mode: str | None) -> None:
+        await self.bot.edit_message_text(
+            text,
+            chat_id=self.chat_id,
+            message_id=self.message_id,
+            inline_message_id=self.inline_message_id,
+            parse_mode=parse_mode,
+        )
@@ -0,0 +1,95 @@
+"""Peak RSS of concurrent media downloads forwarded to the media service.
+
+Each transfer reads a file from a stub Bot API download in 64KB chunks and
+uploads it to a stub media service that discards the body as it arrives.
+"buffered" collects the whole download first, as `bot.download_file` did;
+"streaming" spools through `media.spool` within `media.budget()`. Every
+mode runs in a fresh process so `ru_maxrss` is its own.
+
+    python -m benchmarks.media_pipeline --files 50 --size-mb 20
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import resource
+import time
+from collections.abc import AsyncGenerator
+from io import BytesIO
+
+import httpx
+
+from utils import media
+from utils.http_clients import HttpClients
+
+CHUNK = 64 * 1024
+
+
+class DrainTransport(httpx.AsyncBaseTransport):
+    """Media service stub that reads uploads without keeping them."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async for _ in request.stream:
+            pass
+        return httpx.Response(200, json={"uid": "1", "url": "https://media.test/f/1"})
+
+
+async def download(size: int) -> AsyncGenerator[bytes]:
+    for _ in range(size // CHUNK):
+        await asyncio.sleep(0)
+        yield os.urandom(CHUNK)
+
+
+async def buffered(size: int) -> None:
+    data = b"".join([chunk async for chunk in download(size)])
+    await media.upload_file(BytesIO(data), file_name="file.bin")
+
+
+async def streaming(size: int) -> None:
+    async with media.budget().reserve(size):
+        with await media.spool(download(size)) as file:
+            await media.upload_file(file, file_name="file.bin")
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode: str, files: int, size: int) -> tuple[float, float, float]:
+    HttpClients().clients["media"] = httpx.AsyncClient(
+        base_url="https://media.test", transport=DrainTransport()
+    )
+    transfer = {"buffered": buffered, "streaming": streaming}[mode]
+
+    async def run() -> None:
+        await asyncio.gather(*(transfer(size) for _ in range(files)))
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    asyncio.run(run())
+    return baseline, rss_mb(), time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=20)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    print(f"{args.files} x {args.size_mb}MB")
+    print(f"{'mode':>10} {'peak RSS':>10} {'growth':>10} {'time':>7}")
+    for mode in ("buffered", "streaming"):
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            baseline, peak, seconds = pool.submit(
+                measure, mode, args.files, size
+            ).result()
+        print(f"{mode:>10} {peak:8.0f}MB {peak - baseline:8.0f}MB {seconds:6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
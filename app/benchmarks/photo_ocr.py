@@ -0,0 +1,112 @@
+"""Bytes sent and end-to-end latency of photo OCR, with and without preparing.
+
+Each photo is a synthetic page of text, shot sideways in color, saved the
+way Telegram keeps photos: JPEG variants of 320, 800, 1280 and 2560 pixels.
+"largest" downloads and uploads the biggest variant as it is, as
+`bot_actions.photo` did; "prepared" downloads `services.pick_photo_size`
+and uploads `images.prepare`'s output. Transfers take `--mbps`, and the
+OCR stub takes `--ms-per-mp` per megapixel it reads. Needs Pillow.
+
+    python -m benchmarks.photo_ocr --photos 20 --mbps 20 --ms-per-mp 400
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFilter
+from telebot import types
+
+from apps.bots import services
+from server.config import Settings
+from utils import images
+
+VARIANTS = (320, 800, 1280, 2560)
+
+
+def page_photo(seed: int) -> dict[int, bytes]:
+    """A text page photographed sideways, as Telegram's JPEG variants."""
+    rng = random.Random(seed)
+    page = Image.new("RGB", (1810, 2560), (236, 230, 214))
+    draw = ImageDraw.Draw(page)
+    for top in range(140, 2420, 44):
+        left = 120
+        while left < 1650:
+            width = rng.randint(30, 160)
+            draw.rectangle((left, top, left + width, top + 22), fill=(40, 38, 52))
+            left += width + 18
+    page = page.filter(ImageFilter.GaussianBlur(1.2)).rotate(90, expand=True)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # viewed rotated back by 90°
+
+    variants = {}
+    for side in VARIANTS:
+        variant = page.copy()
+        variant.thumbnail((side, side))
+        output = BytesIO()
+        variant.save(output, "JPEG", quality=87, exif=exif)
+        variants[side] = output.getvalue()
+    return variants
+
+
+def photo_sizes() -> list[types.PhotoSize]:
+    return [
+        types.PhotoSize(
+            file_id=str(side),
+            file_unique_id=str(side),
+            width=side,
+            height=round(side * 1810 / 2560),
+        )
+        for side in VARIANTS
+    ]
+
+
+def megapixels(data: bytes) -> float:
+    with Image.open(BytesIO(data)) as image:
+        return image.width * image.height / 1e6
+
+
+async def run(
+    mode: str, variants: dict[int, bytes], mbps: float, ms_per_mp: float
+) -> tuple[int, float]:
+    """Bytes uploaded and seconds from download to OCR result."""
+    started = time.perf_counter()
+    if mode == "largest":
+        downloaded = variants[VARIANTS[-1]]
+    else:
+        downloaded = variants[int(services.pick_photo_size(photo_sizes()).file_id)]
+    await asyncio.sleep(len(downloaded) * 8 / (mbps * 1e6))
+
+    uploaded = downloaded if mode == "largest" else await images.prepare(downloaded)
+    await asyncio.sleep(len(uploaded) * 8 / (mbps * 1e6))
+    await asyncio.sleep(megapixels(uploaded) * ms_per_mp / 1000)
+    return len(uploaded), time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--photos", type=int, default=20)
+    parser.add_argument("--mbps", type=float, default=20)
+    parser.add_argument("--ms-per-mp", type=float, default=400)
+    args = parser.parse_args()
+    photos = [page_photo(seed) for seed in range(args.photos)]
+
+    print(f"{args.photos} photos, OCR_IMAGE_SIDE={Settings.ocr_image_side}")
+    print(f"{'mode':>9} {'avg bytes':>10} {'avg latency':>12} {'p95':>8}")
+    for mode in ("largest", "prepared"):
+        results = [
+            await run(mode, variants, args.mbps, args.ms_per_mp) for variants in photos
+        ]
+        sizes = [size for size, _ in results]
+        latencies = sorted(seconds for _, seconds in results)
+        p95 = latencies[min(len(latencies) - 1, round(0.95 * (len(latencies) - 1)))]
+        print(
+            f"{mode:>9} {sum(sizes) / len(sizes) / 1024:8.0f}KB"
+            f" {sum(latencies) / len(latencies) * 1000:10.0f}ms {p95 * 1000:6.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
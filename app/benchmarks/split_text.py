@@ -0,0 +1,74 @@
+"""Time `split_text` on large inputs, batch and streaming.
+
+Inputs are ~1MB of generated markdown: prose paragraphs, one paragraph with
+no line breaks, and fenced code blocks. The streaming run feeds the same
+text in LLM-sized deltas.
+
+    python -m benchmarks.split_text --size-mb 1
+"""
+
+import argparse
+import random
+import time
+
+from utils.texttools import TextSplitter, split_text
+
+WORDS = ["lorem", "ipsum", "dolor.", "**sit**", "`amet`", "[x](https://x.io)", "سلام"]
+
+
+def prose(rng: random.Random, size: int) -> str:
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choices(WORDS, k=rng.randrange(5, 120)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def make_inputs(size: int) -> dict[str, str]:
+    rng = random.Random(0)
+    code = "\n".join(
+        f"```python\n{'x = compute(x)  # step\n' * rng.randrange(10, 400)}```\n"
+        + prose(rng, 2000)
+        for _ in range(size // 10000)
+    )
+    return {
+        "prose": prose(rng, size),
+        "one line": prose(rng, size).replace("\n", " "),
+        "code": code,
+    }
+
+
+def timed(fn: object, *args: object) -> tuple[list[str], float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def stream(text: str, delta: int) -> list[str]:
+    splitter = TextSplitter()
+    chunks = []
+    for start in range(0, len(text), delta):
+        chunks += splitter.feed(text[start : start + delta])
+    return chunks + splitter.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--delta", type=int, default=16)
+    args = parser.parse_args()
+
+    for name, text in make_inputs(int(args.size_mb * 1024 * 1024)).items():
+        chunks, batch = timed(split_text, text)
+        streamed, streaming = timed(stream, text, args.delta)
+        print(
+            f"{name:>9}: {len(text) / 1024:7.0f} KiB -> {len(chunks):4d} chunks "
+            f"(max {max(map(len, chunks))}), batch {batch * 1000:7.1f} ms, "
+            f"streaming {streaming * 1000:7.1f} ms ({len(streamed)} chunks)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare single-stream and parallel Telethon downloads against a stub DC.
+
+The stub charges a fixed round trip per `upload.getFile` request plus a
+per-request transfer time, which is how a single MTProto stream behaves.
+
+    python -m benchmarks.telethon_download --size-mb 100 --rtt-ms 80
+"""
+
+import argparse
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+
+from utils.downloads import MAX_PART_SIZE, iter_parallel_download
+
+
+class StubClient:
+    def __init__(self, data: bytes, rtt: float, bandwidth: float) -> None:
+        self.data = data
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.requests = 0
+
+    async def iter_download(
+        self,
+        file: object,
+        *,
+        offset: int = 0,
+        limit: int | None = None,
+        request_size: int = MAX_PART_SIZE,
+        file_size: int | None = None,
+    ) -> AsyncGenerator[bytes]:
+        sent = 0
+        while offset < len(self.data) and (limit is None or sent < limit):
+            chunk = self.data[offset : offset + request_size]
+            self.requests += 1
+            await asyncio.sleep(self.rtt + len(chunk) / self.bandwidth)
+            yield chunk
+            offset += request_size
+            sent += 1
+
+
+async def run(size: int, rtt: float, bandwidth: float, parallelism: int) -> None:
+    data = bytes(size)
+
+    client = StubClient(data, rtt, bandwidth)
+    start = time.perf_counter()
+    single = b"".join([chunk async for chunk in client.iter_download(None)])
+    single_time = time.perf_counter() - start
+
+    client = StubClient(data, rtt, bandwidth)
+    start = time.perf_counter()
+    parallel = b"".join([
+        chunk
+        async for chunk in iter_parallel_download(
+            client, None, size, parallelism=parallelism
+        )
+    ])
+    parallel_time = time.perf_counter() - start
+
+    assert single == parallel == data
+    for name, elapsed in (("single", single_time), ("parallel", parallel_time)):
+        print(f"{name:>8}: {elapsed:6.2f}s  {size / elapsed / 2**20:7.2f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=80)
+    parser.add_argument("--stream-mbps", type=float, default=40)
+    parser.add_argument("--parallelism", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(
+        run(
+            int(args.size_mb * 2**20),
+            args.rtt_ms / 1000,
+            args.stream_mbps * 2**20 / 8,
+            args.parallelism,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Time to first audio for "read" on texts of growing length.
+
+The speech provider is a local stub whose latency grows with the input
+(`--base-ms` plus `--ms-per-char`). "single" synthesizes the whole text in
+one request, as before; "segmented" splits it at sentences and sends the
+first segment as soon as it is ready.
+
+    python -m benchmarks.tts_first_audio --lengths 200 1000 4000
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import types
+from pathlib import Path
+
+import httpx
+import openai
+
+from apps.bots import models, services
+from server.config import Settings
+from utils import audio
+
+SENTENCE = "The quick brown fox jumps over the lazy dog again. "
+
+
+class StubBot:
+    token = "123456:benchmark"  # noqa: S105
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.first_audio: float | None = None
+
+    async def send_voice(self, chat_id: int, voice: object) -> object:
+        await asyncio.sleep(0)
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter() - self.started
+        return types.SimpleNamespace(voice=None)
+
+
+def stub_client(base: float, per_char: float) -> openai.AsyncOpenAI:
+    async def speech(request: httpx.Request) -> httpx.Response:
+        text = json.loads(request.content)["input"]
+        await asyncio.sleep(base + per_char * len(text))
+        return httpx.Response(200, content=b"OggS" * len(text))
+
+    return openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="benchmark",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(speech)),
+    )
+
+
+async def first_audio(text: str, segment_chars: int) -> float:
+    Settings.tts_segment_chars = segment_chars
+    services.speech_files.cache_clear()
+    bot = StubBot()
+    with tempfile.TemporaryDirectory() as directory:
+        # a fresh cache, so neither run reads the other's audio
+        Settings.tts_cache_dir = Path(directory)
+        await services.send_speech(bot, 42, text)
+    return bot.first_audio
+
+
+async def run(lengths: list[int], base: float, per_char: float) -> None:
+    client = stub_client(base, per_char)
+    services.get_openai = lambda: client
+
+    async def no_upload(*args: object, **kwargs: object) -> None:
+        await asyncio.sleep(0)
+
+    async def join(parts: list[bytes]) -> bytes:
+        await asyncio.sleep(0)
+        return b"".join(parts)
+
+    models.SpeechFile.find_one = no_upload
+    # the stub's audio is not real Ogg; joining is not what is measured
+    audio.ffmpeg_available = lambda: True
+    audio.concat_ogg = join
+    segment_chars = Settings.tts_segment_chars
+    print(f"{'chars':>6} {'single':>9} {'segmented':>10}")
+    for length in lengths:
+        text = (SENTENCE * (length // len(SENTENCE) + 1))[:length]
+        single = await first_audio(text, 10**9)
+        segmented = await first_audio(text, segment_chars)
+        print(f"{length:6d} {single * 1000:7.0f}ms {segmented * 1000:8.0f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[200, 1000, 4000])
+    parser.add_argument("--base-ms", type=float, default=300)
+    parser.add_argument("--ms-per-char", type=float, default=1.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.lengths, args.base_ms / 1000, args.ms_per_char / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Count USSO round trips for a stream of updates, before and after batching.
+
+"before" models the previous code path: a TTL cache without coalescing in
+front of one USSO session and request per lookup. "after" goes through
+`get_usso_user` (identity cache + batch loader). USSO is a local stub with
+fixed latency.
+
+    python -m benchmarks.usso_batching --updates 1000 --users 300
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from apps.accounts import handlers
+
+
+class StubUsso:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.sessions = 0
+        self.requests = 0
+
+    @asynccontextmanager
+    async def session(self) -> AsyncGenerator[object]:
+        self.sessions += 1
+        await asyncio.sleep(self.latency)  # connection setup
+        yield self
+
+    async def fetch_user(self, session: object, credentials: dict) -> dict:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return {"uid": credentials["representor"]}
+
+
+def make_bursts(updates: int, users: int, burst: int) -> list[list[dict]]:
+    rng = random.Random(0)
+    stream = [
+        {"auth_method": "telegram", "representor": str(rng.randrange(users))}
+        for _ in range(updates)
+    ]
+    return [stream[i : i + burst] for i in range(0, updates, burst)]
+
+
+async def before(stub: StubUsso, bursts: list[list[dict]], gap: float) -> None:
+    cache: dict[tuple, dict] = {}
+
+    async def lookup(credentials: dict) -> dict:
+        key = handlers.credentials_key(credentials)
+        if key not in cache:
+            async with stub.session() as session:
+                cache[key] = await stub.fetch_user(session, credentials)
+        return cache[key]
+
+    for burst in bursts:
+        await asyncio.gather(*(lookup(credentials) for credentials in burst))
+        await asyncio.sleep(gap)
+
+
+async def after(stub: StubUsso, bursts: list[list[dict]], gap: float) -> None:
+    handlers.usso_users.clear()
+    handlers.get_usso_session = stub.session
+    handlers.fetch_usso_user = stub.fetch_user
+    for burst in bursts:
+        await asyncio.gather(
+            *(handlers.get_usso_user(credentials) for credentials in burst)
+        )
+        await asyncio.sleep(gap)
+
+
+async def run(updates: int, users: int, burst: int, latency: float) -> None:
+    bursts = make_bursts(updates, users, burst)
+    per_thousand = 1000 / updates
+    for name, path in (("before", before), ("after", after)):
+        stub = StubUsso(latency)
+        start = time.perf_counter()
+        await path(stub, bursts, latency / 10)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>6}: {stub.requests * per_thousand:7.1f} requests and "
+            f"{stub.sessions * per_thousand:7.1f} sessions per 1000 updates "
+            f"({elapsed:.2f}s)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.updates, args.users, args.burst, args.latency_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
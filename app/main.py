@@ -6,6 +6,9 @@ from pathlib import Path
 
 import uvicorn
 
+from apps.bots.dispatcher import BotUpdateDispatcher
+from apps.bots.handlers import BotHandler
+from server.config import Settings
 from server.server import app
 
 __all__ = ["app"]
@@ -26,11 +29,13 @@ async def main() -> None:
     loop = asyncio.get_running_loop()
 
     stop_event = asyncio.Event()
+    stop_signal = signal.SIGTERM
 
     def shutdown(sig: int) -> None:
+        nonlocal stop_signal
         logging.info("Received stop signal %d. Initiating graceful shutdown...", sig)
+        stop_signal = sig
         stop_event.set()
-        server.handle_exit(sig=sig, frame=None)
 
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, shutdown, sig)
@@ -41,7 +46,12 @@ async def main() -> None:
     # Wait for signal
     await stop_event.wait()
 
+    # Finish queued bot updates while webhooks are answered with 503
+    await BotUpdateDispatcher().drain(grace_period=Settings.update_drain_timeout)
+    await BotHandler().drain_albums(grace_period=Settings.update_drain_timeout)
+
     # Now gracefully shutdown server
+    server.handle_exit(sig=stop_signal, frame=None)
     logging.info("Shutdown complete.")
 
     # Optional: wait for server task to finish if needed
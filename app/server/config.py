@@ -32,6 +32,98 @@ class Settings(config.Settings):
         "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"
     )
     soniox_api_key: str | None = os.getenv("SONIOX_API_KEY")
+    llm_model: str = os.getenv("LLM_MODEL", "openai/gpt-4o-mini")
+    stream_edit_interval: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1"))
+    stream_edit_max_interval: float = float(os.getenv("STREAM_EDIT_MAX_INTERVAL", "10"))
+
+    update_queue_size: int = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+    update_workers: int = int(os.getenv("UPDATE_WORKERS", "16"))
+    update_drain_timeout: float = float(os.getenv("UPDATE_DRAIN_TIMEOUT", "30"))
+    update_dedup_window: int = int(os.getenv("UPDATE_DEDUP_WINDOW", "10000"))
+    update_dedup_backend: str = os.getenv("UPDATE_DEDUP_BACKEND", "memory")
+    update_dedup_ttl: int = int(os.getenv("UPDATE_DEDUP_TTL", str(60 * 60)))
+
+    identity_cache_size: int = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+    identity_cache_ttl: float = float(os.getenv("IDENTITY_CACHE_TTL", str(60 * 60)))
+    identity_cache_stale_ttl: float = float(
+        os.getenv("IDENTITY_CACHE_STALE_TTL", str(60 * 60 * 23))
+    )
+    identity_cache_negative_ttl: float = float(
+        os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "60")
+    )
+    usso_batch_window: float = float(os.getenv("USSO_BATCH_WINDOW", "0.01"))
+    usso_batch_size: int = int(os.getenv("USSO_BATCH_SIZE", "100"))
+    usso_concurrency: int = int(os.getenv("USSO_CONCURRENCY", "10"))
+
+    bot_global_rate: float = float(os.getenv("BOT_GLOBAL_RATE", "30"))
+    bot_chat_rate: float = float(os.getenv("BOT_CHAT_RATE", "1"))
+    bot_group_rate: float = float(os.getenv("BOT_GROUP_RATE", str(20 / 60)))
+    bot_retry_after_attempts: int = int(os.getenv("BOT_RETRY_AFTER_ATTEMPTS", "3"))
+    edit_cache_size: int = int(os.getenv("EDIT_CACHE_SIZE", "10000"))
+    bot_identity_refresh_interval: float = float(
+        os.getenv("BOT_IDENTITY_REFRESH_INTERVAL", str(6 * 60 * 60))
+    )
+    stt_segment_seconds: float = float(os.getenv("STT_SEGMENT_SECONDS", "60"))
+    stt_segment_overlap: float = float(os.getenv("STT_SEGMENT_OVERLAP", "1.5"))
+    stt_concurrency: int = int(os.getenv("STT_CONCURRENCY", "4"))
+    tts_model: str = os.getenv("TTS_MODEL", "tts-1")
+    tts_voice: str = os.getenv("TTS_VOICE", "alloy")
+    tts_segment_chars: int = int(os.getenv("TTS_SEGMENT_CHARS", "500"))
+    tts_concurrency: int = int(os.getenv("TTS_CONCURRENCY", "4"))
+    tts_cache_dir: Path = Path(
+        os.getenv("TTS_CACHE_DIR", str(base_dir / "cache" / "tts"))
+    )
+    tts_cache_max_bytes: int = int(
+        os.getenv("TTS_CACHE_MAX_BYTES", str(500 * 1024 * 1024))
+    )
+    media_cache_dir: Path = Path(
+        os.getenv("MEDIA_CACHE_DIR", str(base_dir / "cache" / "media"))
+    )
+    media_cache_max_bytes: int = int(
+        os.getenv("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024))
+    )
+    voice_archive: bool = os.getenv("VOICE_ARCHIVE", "false").lower() == "true"
+    telegram_api_id: str | None = os.getenv("TELEGRAM_API_ID")
+    telegram_api_hash: str | None = os.getenv("TELEGRAM_API_HASH")
+    telethon_part_size: int = int(os.getenv("TELETHON_PART_SIZE", str(512 * 1024)))
+    telethon_parallelism: int = int(os.getenv("TELETHON_PARALLELISM", "4"))
+    telethon_parallel_threshold: int = int(
+        os.getenv("TELETHON_PARALLEL_THRESHOLD", str(10 * 1024 * 1024))
+    )
+
+    media_base_url: str = os.getenv(
+        "MEDIA_BASE_URL", "https://media.uln.me/api/media/v1/"
+    )
+    ocr_inline_max_bytes: int = int(os.getenv("OCR_INLINE_MAX_BYTES", "8192"))
+    ocr_compress_min_bytes: int = int(
+        os.getenv("OCR_COMPRESS_MIN_BYTES", str(10 * 1024 * 1024))
+    )
+    ocr_poll_initial_interval: float = float(
+        os.getenv("OCR_POLL_INITIAL_INTERVAL", "60")
+    )
+    ocr_poll_max_interval: float = float(os.getenv("OCR_POLL_MAX_INTERVAL", "600"))
+    ocr_poll_batch_size: int = int(os.getenv("OCR_POLL_BATCH_SIZE", "50"))
+    ocr_submit_timeout: float = float(os.getenv("OCR_SUBMIT_TIMEOUT", "600"))
+    ocr_delivery_lease: float = float(os.getenv("OCR_DELIVERY_LEASE", "300"))
+    ocr_image_side: int = int(os.getenv("OCR_IMAGE_SIDE", "2000"))
+    ocr_image_quality: int = int(os.getenv("OCR_IMAGE_QUALITY", "80"))
+    ocr_image_workers: int = int(
+        os.getenv("OCR_IMAGE_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+    media_spool_threshold: int = int(
+        os.getenv("MEDIA_SPOOL_THRESHOLD", str(1024 * 1024))
+    )
+    media_inflight_bytes: int = int(
+        os.getenv("MEDIA_INFLIGHT_BYTES", str(256 * 1024 * 1024))
+    )
+    album_window: float = float(os.getenv("ALBUM_WINDOW", "1.0"))
+    proxy: str | None = os.getenv("PROXY")
+
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    openrouter_max_connections: int = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "50"))
+    media_max_connections: int = int(os.getenv("MEDIA_MAX_CONNECTIONS", "20"))
+    ai_max_connections: int = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+    bot_files_max_connections: int = int(os.getenv("BOT_FILES_MAX_CONNECTIONS", "20"))
 
     @classmethod
     def get_log_config(cls, console_level: str = "INFO", **kwargs: object) -> dict:
@@ -1,18 +1,45 @@
-from fastapi import APIRouter
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI
 from fastapi_mongo_base.core import app_factory
 
+from apps.ai.poller import OCRPoller
 from apps.ai.routes import router as ai_router
+from apps.bots.dispatcher import BotUpdateDispatcher
 from apps.bots.handlers import BotHandler
 from apps.bots.routes import router as bots_router
+from utils import metrics
+from utils.http_clients import HttpClients
 
 from . import config
 
-app = app_factory.create_app(
-    settings=config.Settings(), init_functions=[BotHandler().setup]
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    async with app_factory.lifespan(
+        app=app,
+        init_functions=[HttpClients().setup, BotHandler().setup, OCRPoller().setup],
+        settings=config.Settings(),
+    ):
+        yield
+    await BotUpdateDispatcher().drain(grace_period=config.Settings.update_drain_timeout)
+    await BotHandler().drain_albums(grace_period=config.Settings.update_drain_timeout)
+    await BotHandler().shutdown()
+    await OCRPoller().shutdown()
+    await HttpClients().close()
+
+
+app = app_factory.create_app(settings=config.Settings(), lifespan_func=lifespan)
 server_router = APIRouter()
 
 for router in [bots_router, ai_router]:
     server_router.include_router(router)
 
+
+@server_router.get("/metrics", include_in_schema=False)
+async def metrics_snapshot() -> dict[str, dict[str, object]]:
+    return metrics.snapshot()
+
+
 app.include_router(server_router, prefix=config.Settings.base_path)
@@ -0,0 +1,59 @@
+import asyncio
+import types
+
+import pytest
+
+from apps.bots import albums
+from server.config import Settings
+
+
+def album_message(message_id: int, media_group_id: str = "g1") -> object:
+    return types.SimpleNamespace(message_id=message_id, media_group_id=media_group_id)
+
+
+@pytest.mark.asyncio
+async def test_album_parts_are_handled_together(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Settings, "album_window", 0.05)
+    handled: list[list[int]] = []
+
+    async def handler(messages: list, bot: object) -> None:
+        await asyncio.sleep(0)
+        handled.append([message.message_id for message in messages])
+
+    collector = albums.AlbumCollector(handler)
+    bot = types.SimpleNamespace(token="t")
+    for message_id in (12, 10):
+        collector.add(album_message(message_id), bot)
+        await asyncio.sleep(0.02)
+    collector.add(album_message(11), bot)
+    collector.add(album_message(20, media_group_id="g2"), bot)
+    assert handled == []
+
+    await asyncio.sleep(0.1)
+    assert sorted(handled) == [[10, 11, 12], [20]]
+    assert collector.pending == {}
+
+
+@pytest.mark.asyncio
+async def test_drain_handles_albums_still_being_gathered(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Settings, "album_window", 60)
+    handled: list[list[int]] = []
+
+    async def handler(messages: list, bot: object) -> None:
+        await asyncio.sleep(0.01)
+        handled.append([message.message_id for message in messages])
+
+    collector = albums.AlbumCollector(handler)
+    bot = types.SimpleNamespace(token="t")
+    for message_id in (2, 1):
+        collector.add(album_message(message_id), bot)
+
+    await collector.drain(grace_period=1)
+    assert handled == [[1, 2]]
+    assert collector.pending == {}
+    assert collector.timers == {}
+    assert collector.tasks == set()
@@ -0,0 +1,172 @@
+import asyncio
+import time
+
+import pytest
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
+
+from apps.bots import base_bot, middlewares
+from apps.bots.handlers import BotRegistry, get_bot, get_bot_by_route
+from utils import metrics
+from utils.ratelimit import ChatRateLimiter
+
+TENANT_TOKEN = "123456:tenant-token"
+
+
+def test_registry_resolves_class_bots(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(base_bot.TelegramBot, "token", TENANT_TOKEN)
+    bot = get_bot(base_bot.TelegramBot.me)
+    assert bot is get_bot_by_route(base_bot.TelegramBot.webhook_route)
+    assert isinstance(bot, base_bot.TelegramBot)
+
+
+def test_registry_builds_tenant_bots_lazily() -> None:
+    registry = BotRegistry()
+    registry.register_token(TENANT_TOKEN, "tenant_bot", "tenant_route")
+    assert "tenant_bot" not in registry.bots
+
+    bot = get_bot_by_route("tenant_route")
+    assert bot is get_bot("tenant_bot")
+    assert bot.me == "tenant_bot"
+    assert bot.message_handlers
+
+    registry.unregister("tenant_bot")
+    with pytest.raises(ValueError, match="not found"):
+        get_bot_by_route("tenant_route")
+
+
+@pytest.mark.asyncio
+async def test_middleware_reuses_cached_identity(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    api_latency = 0.05
+    get_me_calls = 0
+
+    async def get_me() -> types.User:
+        nonlocal get_me_calls
+        get_me_calls += 1
+        await asyncio.sleep(api_latency)
+        return types.User(id=123456, is_bot=True, first_name="bot", username="bot")
+
+    bot = base_bot.BaseBot(TENANT_TOKEN)
+    monkeypatch.setattr(bot, "get_me", get_me)
+    monkeypatch.setattr(middlewares, "get_usso_user", lambda credentials: _none())
+    await bot.refresh_identity()
+    assert bot.link == "https://t.me/bot"
+
+    middleware = middlewares.UserMiddleware(bot)
+    message = types.Message.de_json({
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "user"},
+        "text": "hi",
+    })
+    start = time.perf_counter()
+    for _ in range(10):
+        await middleware.pre_process_message(message, None)
+    elapsed = time.perf_counter() - start
+
+    assert get_me_calls == 1
+    assert elapsed < api_latency
+
+
+async def _none() -> None:
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_per_chat_budget_spaces_sends() -> None:
+    limiter = ChatRateLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+    start = time.perf_counter()
+    for _ in range(3):
+        await limiter.acquire(1)
+    await limiter.acquire(2)
+    elapsed = time.perf_counter() - start
+
+    assert 0.09 <= elapsed < 0.2
+    assert set(limiter.slowest_chats()) == {"1", "2"}
+
+
+@pytest.mark.asyncio
+async def test_throttled_requeues_after_retry_after() -> None:
+    bot = base_bot.BaseBot(TENANT_TOKEN)
+    calls = 0
+
+    async def send(chat_id: int, text: str) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        if calls == 1:
+            raise ApiTelegramException(
+                "sendMessage",
+                None,
+                {
+                    "error_code": 429,
+                    "description": "Too Many Requests",
+                    "parameters": {"retry_after": 0.05},
+                },
+            )
+        return text
+
+    start = time.perf_counter()
+    assert await bot.throttled(1, send, 1, "hi") == "hi"
+    assert calls == 2
+    assert 0.05 <= time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_redundant_edits_are_skipped_and_coalesced(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sent = []
+
+    async def edit_message_text(self: base_bot.BaseBot, **kwargs: object) -> bool:
+        sent.append(kwargs["text"])
+        await asyncio.sleep(0)
+        return True
+
+    bot = base_bot.BaseBot(TENANT_TOKEN)
+    monkeypatch.setattr(base_bot.AsyncTeleBot, "edit_message_text", edit_message_text)
+    before = metrics.snapshot()["counters"]
+
+    await bot.edit_message_text("same", chat_id=42, message_id=1)
+    await bot.edit_message_text("same", chat_id=42, message_id=1)
+    assert sent == ["same"]
+
+    # while the chat is out of budget, queued edits collapse into the latest
+    bot.rate_limiter.pause(42, 0.1)
+    await asyncio.gather(
+        *(bot.edit_message_text(f"v{i}", chat_id=42, message_id=1) for i in range(5))
+    )
+    assert sent == ["same", "v4"]
+
+    counters = metrics.snapshot()["counters"]
+    skipped = "bot.outbound.edits_skipped"
+    coalesced = "bot.outbound.edits_coalesced"
+    assert counters[skipped] - before.get(skipped, 0) == 1
+    assert counters[coalesced] - before.get(coalesced, 0) == 4
+
+
+@pytest.mark.asyncio
+async def test_edit_back_while_another_waits_is_not_lost(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sent = []
+
+    async def edit_message_text(self: base_bot.BaseBot, **kwargs: object) -> bool:
+        sent.append(kwargs["text"])
+        await asyncio.sleep(0)
+        return True
+
+    bot = base_bot.BaseBot(TENANT_TOKEN)
+    monkeypatch.setattr(base_bot.AsyncTeleBot, "edit_message_text", edit_message_text)
+
+    await bot.edit_message_text("A", chat_id=42, message_id=1)
+    bot.rate_limiter.pause(42, 0.05)
+    await asyncio.gather(
+        bot.edit_message_text("B", chat_id=42, message_id=1),
+        bot.edit_message_text("A", chat_id=42, message_id=1),
+    )
+    # the message still shows "A", so nothing else had to be sent
+    assert sent == ["A"]
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from utils import metrics
+from utils.batching import BatchLoader
+from utils.cache import AsyncCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once() -> None:
+    calls = 0
+
+    async def loader() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "user"
+
+    cache = AsyncCache("test_single_flight")
+    results = await asyncio.gather(*(cache.get("key", loader) for _ in range(10)))
+
+    assert results == ["user"] * 10
+    assert calls == 1
+    assert metrics.snapshot()["counters"]["cache.test_single_flight.coalesced"] == 9
+
+
+@pytest.mark.asyncio
+async def test_negative_results_are_cached() -> None:
+    calls = 0
+
+    async def loader() -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+
+    cache = AsyncCache("test_negative", negative_ttl=60)
+    assert await cache.get("unknown", loader) is None
+    assert await cache.get("unknown", loader) is None
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_served_while_refreshing() -> None:
+    versions = iter(["v1", "v2"])
+
+    async def loader() -> str:
+        await asyncio.sleep(0)
+        return next(versions)
+
+    cache = AsyncCache("test_stale", ttl=0, stale_ttl=60)
+    assert await cache.get("key", loader) == "v1"
+    assert await cache.get("key", loader) == "v1"
+    await asyncio.gather(*cache.loading.values())
+    assert cache.entries["key"].value == "v2"
+
+
+def test_lru_is_bounded() -> None:
+    cache = AsyncCache("test_lru", max_size=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert list(cache.entries) == ["b", "c"]
+    cache.invalidate("b")
+    assert list(cache.entries) == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_batch_loader_resolves_each_caller() -> None:
+    batches: list[list[str]] = []
+
+    async def batch_fn(keys: list[str]) -> dict[str, object]:
+        batches.append(keys)
+        await asyncio.sleep(0)
+        return {key: ValueError(key) if key == "bad" else key.upper() for key in keys}
+
+    loader = BatchLoader("test_batch", batch_fn, window=0.01)
+    results = await asyncio.gather(
+        loader.load("a"),
+        loader.load("b"),
+        loader.load("a"),
+        loader.load("bad"),
+        return_exceptions=True,
+    )
+
+    assert results[:3] == ["A", "B", "A"]
+    assert isinstance(results[3], ValueError)
+    assert batches == [["a", "b", "bad"]]
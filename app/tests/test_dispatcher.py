@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi_mongo_base.core.exceptions import BaseHTTPException
+
+from apps.bots import routes
+from apps.bots.dedup import UpdateDeduplicator
+from apps.bots.dispatcher import DispatcherClosedError, UpdateDispatcher
+from utils import metrics
+
+
+def update(update_id: int, chat_id: int) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}}}
+
+
+@pytest.mark.asyncio
+async def test_updates_are_ordered_per_chat() -> None:
+    handled: list[tuple[int, int]] = []
+    active = 0
+    peak = 0
+
+    async def handler(bot_route: str, update_dict: dict) -> None:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001 * (update_dict["update_id"] % 3))
+        handled.append((update_dict["message"]["chat"]["id"], update_dict["update_id"]))
+        active -= 1
+
+    dispatcher = UpdateDispatcher(handler, max_size=5, workers=3)
+    for update_id in range(30):
+        await dispatcher.submit("bot", update(update_id, update_id % 4))
+    await dispatcher.drain(grace_period=5)
+
+    assert len(handled) == 30
+    assert peak <= 3
+    for chat_id in range(4):
+        ids = [update_id for chat, update_id in handled if chat == chat_id]
+        assert ids == sorted(ids)
+
+
+@pytest.mark.asyncio
+async def test_drain_rejects_new_updates() -> None:
+    async def handler(bot_route: str, update_dict: dict) -> None:
+        await asyncio.sleep(0)
+
+    dispatcher = UpdateDispatcher(handler)
+    await dispatcher.submit("bot", update(1, 1))
+    await dispatcher.drain(grace_period=1)
+
+    assert dispatcher.depth == 0
+    with pytest.raises(DispatcherClosedError):
+        await dispatcher.submit("bot", update(2, 1))
+
+
+@pytest.mark.asyncio
+async def test_duplicate_updates_are_dropped() -> None:
+    deduplicator = UpdateDeduplicator()
+    assert not await deduplicator.is_duplicate("bot", update(10, 1))
+    assert await deduplicator.is_duplicate("bot", update(10, 1))
+    assert not await deduplicator.is_duplicate("other_bot", update(10, 1))
+    assert metrics.snapshot()["counters"]["updates.duplicates.bot"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_shared_window_detects_duplicates() -> None:
+    deduplicator = UpdateDeduplicator()
+    assert not await deduplicator._seen_shared("shared_bot", 1)
+    assert await deduplicator._seen_shared("shared_bot", 1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "mongo"])
+async def test_rejected_update_is_accepted_when_redelivered(
+    monkeypatch: pytest.MonkeyPatch, backend: str
+) -> None:
+    deduplicator = UpdateDeduplicator()
+    monkeypatch.setattr(deduplicator, "backend", backend)
+    closed = UpdateDispatcher(lambda bot_route, update_dict: None)
+    await closed.drain(grace_period=0)
+    monkeypatch.setattr(routes, "BotUpdateDispatcher", lambda: closed)
+
+    with pytest.raises(BaseHTTPException):
+        await routes.bot_update(f"{backend}_bot", update(20, 1))
+
+    assert not await deduplicator.is_duplicate(f"{backend}_bot", update(20, 1))
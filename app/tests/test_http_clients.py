@@ -0,0 +1,26 @@
+import httpx
+import pytest
+
+from utils import metrics
+from utils.http_clients import HttpClients
+
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_until_closed() -> None:
+    clients = HttpClients()
+    media = clients.get("media")
+    assert clients.get("media") is media
+    assert clients.pool_stats("media")["connections"] == 0
+    assert "http_pool.media" in metrics.snapshot()["gauges"]
+
+    await clients.close()
+    assert media.is_closed
+    assert clients.get("media") is not media
+
+
+@pytest.mark.asyncio
+async def test_metrics_route(client: httpx.AsyncClient) -> None:
+    metrics.incr("test.counter")
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["counters"]["test.counter"] >= 1
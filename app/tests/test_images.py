@@ -0,0 +1,109 @@
+import asyncio
+import types as pytypes
+from collections.abc import AsyncGenerator
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from telebot import types
+
+from apps.bots import bot_actions, media_cache, services
+from server.config import Settings
+from utils import images
+
+
+def photo_size(width: int, height: int) -> types.PhotoSize:
+    return types.PhotoSize(
+        file_id=f"f{width}",
+        file_unique_id=f"u{width}",
+        width=width,
+        height=height,
+    )
+
+
+def test_smallest_photo_size_reaching_the_target(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Settings, "ocr_image_side", 1200)
+    sizes = [photo_size(90, 120), photo_size(960, 1280), photo_size(1920, 2560)]
+
+    assert services.pick_photo_size(sizes).width == 960
+
+    monkeypatch.setattr(Settings, "ocr_image_side", 4000)
+    assert services.pick_photo_size(sizes).width == 1920
+
+
+@pytest.mark.asyncio
+async def test_photo_is_sent_as_taken_without_pillow(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(images, "Image", None)
+
+    assert await images.prepare(b"jpeg") == b"jpeg"
+
+
+def test_photo_is_made_upright_grayscale_and_smaller() -> None:
+    image_module = pytest.importorskip("PIL.Image")
+    photo = image_module.effect_noise((1600, 1200), 64).convert("RGB")
+    exif = image_module.Exif()
+    exif[0x0112] = 6  # taken sideways: rotate 90° clockwise to view
+    original = BytesIO()
+    photo.save(original, "JPEG", quality=95, exif=exif)
+
+    prepared = images.prepare_for_ocr(original.getvalue(), max_side=800, quality=80)
+
+    result = image_module.open(BytesIO(prepared))
+    assert result.mode == "L"
+    assert result.size == (600, 800)
+    assert len(prepared) < len(original.getvalue())
+
+
+class StubBot:
+    me = "bot"
+
+    async def reply_to(self, message: types.Message, text: str) -> object:
+        await asyncio.sleep(0)
+        return pytypes.SimpleNamespace(message_id=2)
+
+    async def get_file(self, file_id: str) -> object:
+        await asyncio.sleep(0)
+        return pytypes.SimpleNamespace(file_path=f"photos/{file_id}.jpg")
+
+    async def iter_file(self, file_path: str) -> AsyncGenerator[bytes]:
+        await asyncio.sleep(0)
+        yield file_path.encode()
+
+
+@pytest.mark.asyncio
+async def test_photo_message_is_read(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(Settings, "media_cache_dir", tmp_path)
+    monkeypatch.setattr(Settings, "ocr_image_side", 1200)
+    media_cache.media_files.cache_clear()
+    submitted: list[tuple[bytes, dict, str]] = []
+
+    async def ocr_response(photo: bytes, meta_data: dict, file_unique_id: str) -> None:
+        await asyncio.sleep(0)
+        submitted.append((photo, meta_data, file_unique_id))
+
+    monkeypatch.setattr(services, "ocr_response", ocr_response)
+    message = types.Message.de_json({
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "user"},
+        "photo": [
+            {"file_id": "small", "file_unique_id": "us", "width": 90, "height": 120},
+            {"file_id": "mid", "file_unique_id": "um", "width": 960, "height": 1280},
+            {"file_id": "big", "file_unique_id": "ub", "width": 1920, "height": 2560},
+        ],
+    })
+
+    await bot_actions.message(message, StubBot())
+
+    [(photo, meta_data, file_unique_id)] = submitted
+    assert photo == b"photos/mid.jpg"
+    assert file_unique_id == "um"
+    assert meta_data["chat_id"] == 42
+    media_cache.media_files.cache_clear()
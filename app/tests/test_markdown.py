@@ -0,0 +1,105 @@
+import asyncio
+import random
+
+import pytest
+
+from apps.bots import base_bot
+from utils import metrics
+from utils.markdown import render, utf16_len
+from utils.texttools import escape_markdown
+
+
+def spans(text: str) -> list[tuple[str, int, int]]:
+    plain, entities = render(text)
+    encoded = plain.encode("utf-16-le")
+    return [
+        (e.type, encoded[e.offset * 2 : (e.offset + e.length) * 2].decode("utf-16-le"))
+        for e in entities
+    ]
+
+
+def test_inline_styles_and_links() -> None:
+    plain, _ = render("**bold** *it* ~~gone~~ `x_y` [site](https://x.io) a_b_c")
+
+    assert plain == "bold it gone x_y site a_b_c"
+    assert spans("**bold** *it* ~~gone~~ `x_y` [site](https://x.io) a_b_c") == [
+        ("bold", "bold"),
+        ("italic", "it"),
+        ("strikethrough", "gone"),
+        ("code", "x_y"),
+        ("text_link", "site"),
+    ]
+
+
+def test_unclosed_markers_stay_literal() -> None:
+    plain, entities = render("2 * 3 = 6 and **never closed")
+
+    assert plain == "2 * 3 = 6 and **never closed"
+    assert entities == []
+
+
+def test_blocks() -> None:
+    text = "# Title\n- item\n> quoted\n```python\nprint('*')\n```\ndone"
+    plain, entities = render(text)
+
+    assert plain == "Title\n• item\nquoted\nprint('*')\ndone"
+    assert spans(text) == [
+        ("bold", "Title"),
+        ("blockquote", "quoted"),
+        ("pre", "print('*')"),
+    ]
+    assert entities[-1].language == "python"
+
+
+def test_offsets_are_utf16() -> None:
+    assert spans("😀 **سلام** 😀 `code`") == [("bold", "سلام"), ("code", "code")]
+    assert utf16_len("😀") == 2
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_entities_are_always_well_formed(seed: int) -> None:
+    rng = random.Random(seed)
+    pieces = ["*", "**", "_", "__", "~~", "`", "[", "](https://x.io)", "😀", " ", "a"]
+    text = "".join(rng.choices(pieces, k=200))
+
+    plain, entities = render(text)
+
+    size = utf16_len(plain)
+    for entity in entities:
+        assert entity.length > 0
+        assert entity.offset + entity.length <= size
+    for i, outer in enumerate(entities):
+        end = outer.offset + outer.length
+        for inner in entities[i + 1 :]:
+            assert outer.offset <= inner.offset
+            if inner.offset < end:
+                assert inner.offset + inner.length <= end
+
+
+def test_escape_markdown_escapes_each_character_once() -> None:
+    assert escape_markdown("a=b.c_d") == r"a\=b\.c\_d"
+
+
+@pytest.mark.asyncio
+async def test_send_message_uses_entities(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    async def send_message(*args: object, **kwargs: object) -> None:
+        calls.append((args, kwargs))
+        await asyncio.sleep(0)
+
+    bot = base_bot.BaseBot("123456:tenant-token")
+    monkeypatch.setattr(base_bot.AsyncTeleBot, "send_message", send_message)
+
+    await bot.send_message(42, "**hi** there")
+    await bot.send_message(42, "*raw*", parse_mode="markdown")
+
+    (_, _, text), kwargs = calls[0]
+    assert text == "hi there"
+    assert kwargs["parse_mode"] == ""
+    assert [(e.type, e.offset, e.length) for e in kwargs["entities"]] == [
+        ("bold", 0, 2)
+    ]
+    assert calls[1][0][2] == "*raw*"
+    assert "entities" not in calls[1][1]
+    assert metrics.snapshot()["counters"]["bot.outbound.rendered"] >= 1
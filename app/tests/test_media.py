@@ -0,0 +1,56 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from server.config import Settings
+from utils import media
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_bounds_inflight_bytes() -> None:
+    budget = media.ByteBudget(100)
+    peak = 0
+
+    async def transfer(size: int) -> None:
+        nonlocal peak
+        async with budget.reserve(size):
+            peak = max(peak, budget.used)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(transfer(size) for size in (60, 60, 30, 500, 10)))
+
+    assert peak == 100
+    assert budget.used == 0
+    assert not budget.waiters
+
+
+@pytest.mark.asyncio
+async def test_cancelled_reservation_frees_its_place() -> None:
+    budget = media.ByteBudget(100)
+    async with budget.reserve(80):
+        waiting = asyncio.create_task(budget.reserve(50).__aenter__())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        async with budget.reserve(20):
+            assert budget.used == 100
+    assert budget.used == 0
+
+
+@pytest.mark.asyncio
+async def test_spool_moves_large_files_to_disk(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Settings, "media_spool_threshold", 1024)
+
+    async def chunks(count: int) -> AsyncGenerator[bytes]:
+        for _ in range(count):
+            await asyncio.sleep(0)
+            yield b"x" * 512
+
+    with await media.spool(chunks(1)) as small, await media.spool(chunks(4)) as large:
+        assert not small._rolled
+        assert large._rolled
+        assert large.read() == b"x" * 2048
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import uuid
+import zipfile
+from datetime import UTC, datetime, timedelta
+from io import BytesIO
+
+import httpx
+import pytest
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
+
+from apps.ai import models, ocr, poller
+from apps.bots import handlers
+from server.config import Settings
+
+DOCUMENT = b"%PDF scanned book"
+
+
+class StubBot:
+    def __init__(self) -> None:
+        self.documents: list[tuple[int, str, bytes]] = []
+        self.messages: list[tuple[int, str]] = []
+
+    async def send_document(self, chat_id: int, document: types.InputFile) -> None:
+        await asyncio.sleep(0)
+        self.documents.append((chat_id, document.file_name, document.file.read()))
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        await asyncio.sleep(0)
+        self.messages.append((chat_id, text))
+
+
+def stub_ocr_service(
+    submitted: list[dict],
+    result: bytes = b"# Chapter 1",
+    status: dict[str, str] | None = None,
+) -> httpx.MockTransport:
+    """OCR service stub; `status["task_status"]` is what job lookups report."""
+    jobs: dict[str, dict] = {}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        if request.method == "POST":
+            body = json.loads(request.content)
+            submitted.append(body)
+            job = {**body, "uid": str(uuid.uuid4()), "user_id": "u"}
+            jobs[job["uid"]] = job
+            return httpx.Response(200, json=job)
+        if request.url.path.endswith("/result"):
+            return httpx.Response(200, content=result)
+        job = jobs[request.url.path.rsplit("/", 1)[-1]]
+        return httpx.Response(200, json={**job, **(status or {})})
+
+    return httpx.MockTransport(handle)
+
+
+@pytest.mark.asyncio
+async def test_same_content_shares_one_ocr_job(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_inline_max_bytes", 0)
+    submitted: list[dict] = []
+    uploads: list[int] = []
+    client = ocr.OCRClient(
+        base_url="http://ocr.test", transport=stub_ocr_service(submitted)
+    )
+
+    async def upload() -> str:
+        await asyncio.sleep(0)
+        uploads.append(1)
+        return "https://media/book.pdf"
+
+    def request(chat_id: int) -> object:
+        meta_data = {"chat_id": chat_id, "bot_name": "bot", "file_name": "book.pdf"}
+        return client.asubmit_document(BytesIO(DOCUMENT), meta_data, upload)
+
+    await asyncio.gather(request(1), request(2))
+    assert len(submitted) == 1
+    assert len(uploads) == 1
+
+    job = submitted[0]
+    webhook = ocr.OCRSchema(
+        uid=str(uuid.uuid4()), user_id="u", task_status="completed", **job
+    )
+    await client.aprocess_ocr_webhook(webhook)
+    await client.aprocess_ocr_webhook(webhook)
+    assert sorted(bot.documents) == [
+        (1, "book.md", b"# Chapter 1"),
+        (2, "book.md", b"# Chapter 1"),
+    ]
+
+    await request(3)
+    assert len(submitted) == 1
+    assert bot.documents[-1] == (3, "book.md", b"# Chapter 1")
+
+
+@pytest.mark.asyncio
+async def test_failed_ocr_job_is_submitted_again(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    submitted: list[dict] = []
+    client = ocr.OCRClient(
+        base_url="http://ocr.test", transport=stub_ocr_service(submitted)
+    )
+
+    async def upload() -> str:
+        await asyncio.sleep(0)
+        return "https://media/scan.pdf"
+
+    meta_data = {"chat_id": 1, "bot_name": "bot", "file_name": "scan.pdf"}
+    await client.asubmit_document(BytesIO(b"unreadable"), meta_data, upload)
+    failed = ocr.OCRSchema(
+        uid=str(uuid.uuid4()), user_id="u", task_status="error", **submitted[0]
+    )
+    await client.aprocess_ocr_webhook(failed)
+    assert bot.messages == [(1, ocr.OCR_FAILED)]
+
+    await client.asubmit_document(BytesIO(b"unreadable"), meta_data, upload)
+    assert len(submitted) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("result", "expected"),
+    [
+        (b"", "empty"),
+        (b" \n\n", "empty"),
+        (b"short page", "message"),
+        (b"# Book\n" * 200, "document"),
+        (b"# Book\n" * 2000, "zip"),
+    ],
+)
+async def test_results_are_delivered_by_size(
+    monkeypatch: pytest.MonkeyPatch, result: bytes, expected: str
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_inline_max_bytes", 100)
+    monkeypatch.setattr(Settings, "ocr_compress_min_bytes", 10000)
+    client = ocr.OCRClient(
+        base_url="http://ocr.test", transport=stub_ocr_service([], result)
+    )
+    requester = ocr.MessengerMetaDataSchema(
+        chat_id=1, bot_name="bot", file_name="book.pdf"
+    )
+
+    await client.adeliver("job-1", [requester])
+
+    if expected == "empty":
+        assert bot.messages == [(1, ocr.NO_TEXT_FOUND)]
+        assert bot.documents == []
+    elif expected == "message":
+        assert bot.messages == [(1, "short page")]
+    elif expected == "document":
+        assert bot.documents == [(1, "book.md", result)]
+    else:
+        [(_, name, data)] = bot.documents
+        assert name == "book.zip"
+        assert zipfile.ZipFile(BytesIO(data)).read("book.md") == result
+
+
+def telegram_error(code: int) -> ApiTelegramException:
+    return ApiTelegramException(
+        "sendDocument", None, {"error_code": code, "description": "refused"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_failing_requester_does_not_block_the_others(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    failures = {1: [telegram_error(403)], 2: [telegram_error(502)]}
+    send_document = bot.send_document
+
+    async def flaky_send_document(chat_id: int, document: types.InputFile) -> None:
+        if failures.get(chat_id):
+            raise failures[chat_id].pop()
+        await send_document(chat_id, document)
+
+    monkeypatch.setattr(bot, "send_document", flaky_send_document)
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_inline_max_bytes", 0)
+    submitted: list[dict] = []
+    client = ocr.OCRClient(
+        base_url="http://ocr.test", transport=stub_ocr_service(submitted)
+    )
+
+    async def upload() -> str:
+        await asyncio.sleep(0)
+        return "https://media/book.pdf"
+
+    for chat_id in (1, 2, 3):
+        meta_data = {"chat_id": chat_id, "bot_name": "bot", "file_name": "book.pdf"}
+        await client.asubmit_document(BytesIO(b"shared book"), meta_data, upload)
+    webhook = ocr.OCRSchema(
+        uid=str(uuid.uuid4()), user_id="u", task_status="completed", **submitted[0]
+    )
+    await client.aprocess_ocr_webhook(webhook)
+
+    # blocked chat 1 is dropped, chat 2 failed for now and is kept
+    assert [chat_id for chat_id, _, _ in bot.documents] == [3]
+    document = await models.OCRDocument.find_one({"ocr_uid": webhook.uid})
+    assert [requester.chat_id for requester in document.requesters] == [2]
+
+    await client.adeliver_pending(document.content_hash)
+    assert [chat_id for chat_id, _, _ in bot.documents] == [3, 2]
+    document = await models.OCRDocument.find_one({"ocr_uid": webhook.uid})
+    assert document.requesters == []
+
+
+async def make_due() -> None:
+    await models.OCRDocument.get_pymongo_collection().update_many(
+        {}, {"$set": {"next_poll_at": datetime.now(UTC) - timedelta(seconds=1)}}
+    )
+
+
+@pytest.mark.asyncio
+async def test_lost_webhook_is_recovered_by_polling(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_inline_max_bytes", 0)
+    submitted: list[dict] = []
+    status = {"task_status": "processing"}
+    client = ocr.OCRClient(
+        base_url="http://ocr.test",
+        transport=stub_ocr_service(submitted, status=status),
+    )
+    ocr_poller = poller.OCRPoller()
+    monkeypatch.setattr(ocr_poller, "client", client)
+
+    async def upload() -> str:
+        await asyncio.sleep(0)
+        return "https://media/lost.pdf"
+
+    meta_data = {"chat_id": 7, "bot_name": "bot", "file_name": "lost.pdf"}
+    await client.asubmit_document(BytesIO(b"lost webhook"), meta_data, upload)
+
+    # still running: checked, then left alone for twice as long
+    await make_due()
+    await ocr_poller.poll()
+    document = await models.OCRDocument.find_one({"requesters.chat_id": 7})
+    assert document.poll_interval == 2 * Settings.ocr_poll_initial_interval
+    assert ocr_poller.pending >= 1
+    assert bot.documents == []
+
+    status["task_status"] = "completed"
+    await make_due()
+    await ocr_poller.poll()
+    assert bot.documents == [(7, "lost.md", b"# Chapter 1")]
+
+    # the webhook turning up late sends nothing again
+    late = ocr.OCRSchema(
+        uid=document.ocr_uid, user_id="u", task_status="completed", **submitted[0]
+    )
+    await client.aprocess_ocr_webhook(late)
+    await ocr_poller.poll()
+    assert len(bot.documents) == 1
+
+
+@pytest.mark.asyncio
+async def test_album_is_sent_once_as_one_result(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_inline_max_bytes", 0)
+    submitted: list[dict] = []
+    client = ocr.OCRClient(
+        base_url="http://ocr.test", transport=stub_ocr_service(submitted)
+    )
+
+    async def upload() -> str:
+        await asyncio.sleep(0)
+        return "https://media/page.jpg"
+
+    meta_data = {"chat_id": 5, "bot_name": "bot", "file_name": "album"}
+    album_id = await client.acreate_album(meta_data, 3)
+    parts = [
+        {**meta_data, "album_id": album_id, "album_index": index} for index in range(3)
+    ]
+    await asyncio.gather(
+        client.asubmit_document(BytesIO(b"page 1"), parts[0], upload),
+        client.asubmit_document(BytesIO(b"page 2"), parts[1], upload),
+    )
+    await client.arecord_album_part(ocr.MessengerMetaDataSchema(**parts[2]), None)
+    assert len(submitted) == 2
+
+    for job in submitted:
+        webhook = ocr.OCRSchema(
+            uid=str(uuid.uuid4()), user_id="u", task_status="completed", **job
+        )
+        await client.aprocess_ocr_webhook(webhook)
+        await client.aprocess_ocr_webhook(webhook)
+
+    [(chat_id, name, data)] = bot.documents
+    assert (chat_id, name) == (5, "album.md")
+    assert data.decode().split("\n\n---\n\n") == [
+        "# Chapter 1",
+        "# Chapter 1",
+        "*File 3 could not be read.*",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stale_submission_is_failed_with_a_reply(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    monkeypatch.setattr(Settings, "ocr_submit_timeout", -60)
+    requester = ocr.MessengerMetaDataSchema(chat_id=9, bot_name="bot")
+    await models.OCRDocument(
+        content_hash="stale", requesters=[requester], task_status="init"
+    ).insert()
+
+    await poller.OCRPoller().poll()
+
+    assert bot.messages == [(9, ocr.OCR_FAILED)]
+    assert await models.OCRDocument.find_one({"content_hash": "stale"}) is None
+
+
+@pytest.mark.asyncio
+async def test_failed_submission_tells_everyone_who_joined(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    bot = StubBot()
+    monkeypatch.setattr(handlers, "get_bot", lambda name: bot)
+    client = ocr.OCRClient(base_url="http://ocr.test", transport=stub_ocr_service([]))
+    joined = asyncio.Event()
+
+    async def upload() -> str:
+        await joined.wait()
+        raise httpx.ConnectError("media service down")
+
+    def request(chat_id: int) -> object:
+        meta_data = {"chat_id": chat_id, "bot_name": "bot", "file_name": "a.pdf"}
+        return client.asubmit_document(BytesIO(b"never uploaded"), meta_data, upload)
+
+    first = asyncio.create_task(request(1))
+    await asyncio.sleep(0.01)
+    await request(2)
+    joined.set()
+    with pytest.raises(httpx.ConnectError):
+        await first
+
+    assert sorted(bot.messages) == [(1, ocr.OCR_FAILED), (2, ocr.OCR_FAILED)]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from telebot import types
+
+from apps.bots.streaming import StreamingReply
+from server.config import Settings
+
+
+class StubBot:
+    def __init__(self) -> None:
+        self.edits: list[tuple[str, str | None]] = []
+        self.sent: list[str] = []
+
+    async def edit_message_text(self, text: str, **kwargs: object) -> None:
+        await asyncio.sleep(0)
+        self.edits.append((text, kwargs["parse_mode"]))
+
+    async def send_message(
+        self, chat_id: int, text: str, **kwargs: object
+    ) -> types.Message:
+        await asyncio.sleep(0)
+        self.sent.append(text)
+        return types.Message.de_json({
+            "message_id": len(self.sent) + 100,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        })
+
+
+@pytest.fixture(autouse=True)
+def fast_edits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, "stream_edit_interval", 0.01)
+
+
+async def stream(reply: StreamingReply, deltas: list[str]) -> None:
+    async with reply:
+        for delta in deltas:
+            reply.feed(delta)
+            await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+async def test_edits_are_coalesced() -> None:
+    bot = StubBot()
+    reply = StreamingReply(bot, chat_id=1, message_id=2)
+    await stream(reply, [f"word{i} " for i in range(100)])
+
+    assert 1 < len(bot.edits) < 100
+    assert bot.edits[-1] == (reply.answer, None)
+    assert all(parse_mode == "" for _, parse_mode in bot.edits[:-1])
+    assert reply.first_visible_at is not None
+
+
+@pytest.mark.asyncio
+async def test_long_answers_roll_over() -> None:
+    bot = StubBot()
+    reply = StreamingReply(bot, chat_id=1, message_id=2)
+    await stream(reply, ["x" * 99 + "\n"] * 100)
+
+    assert reply.message_id != 2
+    assert all(len(text) <= 4096 for text, _ in bot.edits)
+    assert len(bot.sent) == 2
+
+
+@pytest.mark.asyncio
+async def test_inline_messages_keep_the_first_chunk() -> None:
+    bot = StubBot()
+    reply = StreamingReply(bot, inline_message_id="inline")
+    await stream(reply, ["y" * 1000] * 5)
+
+    assert not bot.sent
+    assert bot.edits[-1][0] == "y" * 4096
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from utils.texttools import TextSplitter, split_text
+
+WORDS = ["hello", "world.", "**bold**", "`code`", "[link](https://x.io)", "سلام", "a"]
+
+
+def random_text(rng: random.Random, fences: bool) -> str:
+    lines = []
+    for _ in range(rng.randrange(1, 60)):
+        if fences and rng.random() < 0.1:
+            long_fence = "```" + "x" * rng.randrange(1, 800)
+            lines.append(rng.choice(["```", "```python", long_fence]))
+            continue
+        words = rng.choices(WORDS, k=rng.randrange(0, 80))
+        if rng.random() < 0.05:
+            words.append("x" * rng.randrange(1, 400))
+        lines.append(" ".join(words))
+    return "\n".join(lines)
+
+
+def non_space(text: str) -> str:
+    return "".join(text.split())
+
+
+def keeps_content(text: str, chunks: list[str]) -> bool:
+    """Whether `chunks` hold all of `text`, in order.
+
+    Fences closed and reopened across chunks add text, so fenced input
+    only has to be a subsequence, backticks aside.
+    """
+    if "```" not in text:
+        return non_space("".join(chunks)) == non_space(text)
+    remaining = iter(non_space("".join(chunks)).replace("`", ""))
+    return all(char in remaining for char in non_space(text).replace("`", ""))
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_split_text_properties(seed: int) -> None:
+    rng = random.Random(seed)
+    size = rng.randrange(40, 600)
+    text = random_text(rng, fences=seed % 2 == 0)
+
+    chunks = split_text(text, size)
+
+    assert all(0 < len(chunk) <= size for chunk in chunks)
+    # an unterminated block in the input may stay open in the last chunk
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks[:-1])
+    assert keeps_content(text, chunks)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_streaming_matches_batch(seed: int) -> None:
+    rng = random.Random(seed)
+    text = random_text(rng, fences=True)
+
+    splitter = TextSplitter(300)
+    chunks = []
+    start = 0
+    while start < len(text):
+        step = rng.randrange(1, 20)
+        chunks += splitter.feed(text[start : start + step])
+        start += step
+    chunks += splitter.flush()
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks[:-1])
+    assert keeps_content(text, chunks)
+
+
+def test_entities_are_not_split() -> None:
+    text = "intro " + " ".join(["**bold words here**"] * 10)
+
+    chunks = split_text(text, 50)
+
+    assert all(chunk.count("**") % 2 == 0 for chunk in chunks)
+
+
+def test_code_block_is_reopened() -> None:
+    text = "```python\n" + "x = 1\n" * 50 + "```"
+
+    chunks = split_text(text, 60)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("```python\n") for chunk in chunks)
+    assert all(chunk.endswith("```") for chunk in chunks)
+
+
+@pytest.mark.parametrize(
+    "text", ["```" + "x" * 4150 + "```python\n", "```" + "x" * 4090]
+)
+def test_long_opening_fence_line_is_cut_inside_its_block(text: str) -> None:
+    chunks = split_text(text)
+
+    assert all(len(chunk) <= 4096 for chunk in chunks)
+    assert all(chunk.endswith("\n```") for chunk in chunks)
+    assert keeps_content(text, chunks)
+
+
+@pytest.mark.parametrize("text", ["", "  \n"])
+def test_blank_text_is_one_chunk(text: str) -> None:
+    assert split_text(text) == [text]
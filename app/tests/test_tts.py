@@ -0,0 +1,242 @@
+import asyncio
+import json
+import types as pytypes
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+from telebot.asyncio_helper import ApiTelegramException
+
+from apps.bots import models, services
+from server.config import Settings
+from utils import audio
+from utils.file_cache import FileCache
+
+AUDIO = b"OggS" * 1024
+
+
+class StubBot:
+    token = "123456:tenant-token"
+
+    def __init__(self) -> None:
+        self.sent: list[object] = []
+
+    async def send_voice(self, chat_id: int, voice: object) -> object:
+        await asyncio.sleep(0)
+        self.sent.append(voice if isinstance(voice, str) else voice.read())
+        return pytypes.SimpleNamespace(voice=pytypes.SimpleNamespace(file_id="f-1"))
+
+
+@pytest.mark.asyncio
+async def test_file_cache_is_lru_bounded(tmp_path: Path) -> None:
+    fills: list[str] = []
+    cache = FileCache("test_lru", tmp_path, max_bytes=10)
+
+    def filler(key: str) -> object:
+        async def fill(path: Path) -> None:
+            await asyncio.sleep(0.01)
+            fills.append(key)
+            await asyncio.to_thread(path.write_bytes, b"123456")
+
+        return fill
+
+    paths = await asyncio.gather(*(cache.get("a", filler("a")) for _ in range(3)))
+    assert fills == ["a"]
+    assert len(set(paths)) == 1
+
+    await cache.get("b", filler("b"))
+    assert list(cache.files) == ["b"]
+    assert await asyncio.to_thread(lambda: sorted(tmp_path.glob("*"))) == [
+        cache.path("b")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_repeat_reads_reuse_file_id(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    requests: list[httpx.Request] = []
+
+    def stub_speech_endpoint(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=AUDIO)
+
+    client = openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(stub_speech_endpoint)
+        ),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(Settings, "tts_cache_dir", tmp_path)
+    services.speech_files.cache_clear()
+    bot = StubBot()
+
+    await services.send_speech(bot, 42, "read me aloud")
+    await services.send_speech(bot, 42, "read me aloud")
+    path = await services.tts_response("read me aloud")
+
+    assert len(requests) == 1
+    assert bot.sent == [AUDIO, "f-1"]
+    assert path.read_bytes() == AUDIO
+    services.speech_files.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_long_text_sends_first_segment_early(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    async def stub_speech_endpoint(request: httpx.Request) -> httpx.Response:
+        text = json.loads(request.content)["input"]
+        await asyncio.sleep(0.001 * len(text))
+        return httpx.Response(200, content=f"<{text}>".encode())
+
+    client = openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(stub_speech_endpoint)
+        ),
+    )
+
+    async def concat_ogg(parts: list[bytes]) -> bytes:
+        await asyncio.sleep(0)
+        return b"".join(parts)
+
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(Settings, "tts_cache_dir", tmp_path)
+    monkeypatch.setattr(Settings, "tts_segment_chars", 40)
+    monkeypatch.setattr(audio, "ffmpeg_available", lambda: True)
+    monkeypatch.setattr(audio, "concat_ogg", concat_ogg)
+    services.speech_files.cache_clear()
+    bot = StubBot()
+    text = "Short one. " + "This second sentence is a lot longer. " * 3
+
+    await services.send_speech(bot, 42, text)
+
+    assert bot.sent[0] == b"<Short one.>"
+    assert len(bot.sent) == 2
+    path = await services.tts_response(text)
+    assert await asyncio.to_thread(path.read_bytes) == bot.sent[0] + bot.sent[1]
+    services.speech_files.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_long_text_is_one_request_without_ffmpeg(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    requests: list[str] = []
+
+    def stub_speech_endpoint(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["input"])
+        return httpx.Response(200, content=AUDIO)
+
+    client = openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(stub_speech_endpoint)
+        ),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(Settings, "tts_cache_dir", tmp_path)
+    monkeypatch.setattr(Settings, "tts_segment_chars", 40)
+    monkeypatch.setattr(audio, "ffmpeg_available", lambda: False)
+    services.speech_files.cache_clear()
+    bot = StubBot()
+    text = "Short one. " + "This second sentence is a lot longer. " * 3
+
+    await services.send_speech(bot, 42, text)
+
+    # a chained Ogg file would stop after its first segment in some players
+    assert requests == [text]
+    assert bot.sent == [AUDIO]
+    services.speech_files.cache_clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("code", "description", "kept"),
+    [
+        (400, "Bad Request: wrong file identifier/HTTP URL specified", False),
+        (403, "Forbidden: bot was blocked by the user", True),
+    ],
+)
+async def test_cached_file_id_is_dropped_only_when_invalid(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    code: int,
+    description: str,
+    kept: bool,
+) -> None:
+    client = openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200))
+        ),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(Settings, "tts_cache_dir", tmp_path)
+    services.speech_files.cache_clear()
+    bot = StubBot()
+    send_voice = bot.send_voice
+
+    async def reject_file_ids(chat_id: int, voice: object) -> object:
+        if isinstance(voice, str):
+            error = {"error_code": code, "description": description}
+            raise ApiTelegramException("sendVoice", None, error)
+        return await send_voice(chat_id, voice)
+
+    monkeypatch.setattr(bot, "send_voice", reject_file_ids)
+    text = f"hello {code}"
+    key = services.speech_key(text, Settings.tts_model, Settings.tts_voice)
+    await models.SpeechFile(key=key, bot_id="123456", file_id="old").insert()
+
+    if kept:
+        with pytest.raises(ApiTelegramException):
+            await services.send_speech(bot, 42, text)
+    else:
+        await services.send_speech(bot, 42, text)
+
+    cached = await models.SpeechFile.find_one({"key": key, "bot_id": "123456"})
+    assert (cached.file_id == "old") is kept
+    services.speech_files.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_speech_evicted_before_sending_is_synthesized_again(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    tts_response = services.tts_response
+    lookups = 0
+
+    async def evicted_once(text: str, **kwargs: object) -> Path:
+        nonlocal lookups
+        lookups += 1
+        if lookups == 1:
+            return tmp_path / "evicted.bin"
+        return await tts_response(text, **kwargs)
+
+    client = openai.AsyncOpenAI(
+        base_url="http://tts.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, content=AUDIO)
+            )
+        ),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(services, "tts_response", evicted_once)
+    monkeypatch.setattr(Settings, "tts_cache_dir", tmp_path)
+    services.speech_files.cache_clear()
+    bot = StubBot()
+
+    await services.send_speech(bot, 42, "evicted")
+
+    assert bot.sent == [AUDIO]
+    assert lookups == 2
+    services.speech_files.cache_clear()
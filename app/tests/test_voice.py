@@ -0,0 +1,211 @@
+import asyncio
+import types as pytypes
+from collections.abc import AsyncGenerator, Generator
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+from telebot import types
+
+from apps.bots import bot_actions, media_cache, services
+from server.config import Settings
+from utils import audio, media, metrics
+
+VOICE = b"OggS voice"
+
+
+@pytest.fixture(autouse=True)
+def media_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Generator[None]:
+    monkeypatch.setattr(Settings, "media_cache_dir", tmp_path)
+    media_cache.media_files.cache_clear()
+    yield
+    media_cache.media_files.cache_clear()
+
+
+class StubBot:
+    def __init__(self) -> None:
+        self.edits: list[str] = []
+        self.downloads = 0
+
+    async def reply_to(self, message: types.Message, text: str) -> types.Message:
+        await asyncio.sleep(0)
+        return pytypes.SimpleNamespace(message_id=2)
+
+    async def get_file(self, file_id: str) -> pytypes.SimpleNamespace:
+        await asyncio.sleep(0)
+        return pytypes.SimpleNamespace(file_path=f"voice/{file_id}.ogg")
+
+    async def iter_file(self, file_path: str) -> AsyncGenerator[bytes]:
+        await asyncio.sleep(0)
+        self.downloads += 1
+        yield VOICE[:4]
+        yield VOICE[4:]
+
+    async def edit_message_text(self, text: str, **kwargs: object) -> None:
+        await asyncio.sleep(0)
+        self.edits.append(text)
+
+
+def voice_message(file_unique_id: str = "u1") -> types.Message:
+    message = types.Message.de_json({
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "user"},
+        "voice": {"file_id": "f1", "file_unique_id": file_unique_id, "duration": 3},
+        "forward_origin": {"type": "hidden_user", "date": 0, "sender_user_name": "x"},
+    })
+    message.user = pytypes.SimpleNamespace(uid="user-1")
+    return message
+
+
+@pytest.mark.asyncio
+async def test_voice_is_transcribed_from_memory(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    received: list[BytesIO] = []
+    uploads: list[str] = []
+
+    async def stt_response(voice_bytes: BytesIO, **kwargs: object) -> str:
+        await asyncio.sleep(0)
+        received.append(voice_bytes)
+        return "hello"
+
+    async def upload_file(file: BytesIO, file_name: str | None = None) -> str:
+        await asyncio.sleep(0.05)
+        uploads.append(file_name)
+        return "https://media/voice.ogg"
+
+    monkeypatch.setattr(services, "stt_response", stt_response)
+    monkeypatch.setattr(media, "upload_file", upload_file)
+    monkeypatch.setattr(Settings, "voice_archive", True)
+    bot = StubBot()
+
+    await bot_actions.voice(voice_message(), bot)
+
+    assert received[0].getvalue() == VOICE
+    assert bot.edits == ["hello"]
+    # archival runs off the reply path
+    assert uploads == []
+    await asyncio.gather(*media.archive_tasks)
+    assert uploads == ["u1.ogg"]
+
+    timings = metrics.snapshot()["timings"]
+    assert {"voice.download", "voice.stt", "voice.reply"} <= timings.keys()
+
+
+@pytest.mark.asyncio
+async def test_forwarded_voice_reuses_transcription(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    transcribed: list[bytes] = []
+
+    async def stt_response(voice_bytes: BytesIO, **kwargs: object) -> str:
+        await asyncio.sleep(0)
+        transcribed.append(voice_bytes.getvalue())
+        return "viral"
+
+    monkeypatch.setattr(services, "stt_response", stt_response)
+    bot = StubBot()
+
+    await bot_actions.voice(voice_message("viral-1"), bot)
+    await bot_actions.voice(voice_message("viral-1"), bot)
+
+    assert transcribed == [VOICE]
+    assert bot.downloads == 1
+    assert bot.edits == ["viral", "viral"]
+    assert metrics.snapshot()["gauges"]["media_cache.transcription.hit_rate"] > 0
+
+
+SEGMENTS = {
+    b"segment-0": "so the plan for today is",
+    b"segment-1": "for today is to ship the",
+    b"segment-2": "ship the voice pipeline.",
+}
+
+
+def stub_transcription_endpoint(request: httpx.Request) -> httpx.Response:
+    assert request.url.path.endswith("/audio/transcriptions")
+    segment = next(key for key in SEGMENTS if key in request.content)
+    return httpx.Response(200, json={"text": SEGMENTS[segment]})
+
+
+@pytest.mark.asyncio
+async def test_long_audio_is_transcribed_in_segments(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def plan_audio(data: bytes, **kwargs: object) -> list[tuple[float, float]]:
+        await asyncio.sleep(0)
+        return [(0, 60), (58.5, 120), (118.5, 150)]
+
+    async def cut_segment(data: bytes, start: float, end: float) -> bytes:
+        await asyncio.sleep(0.01 * (3 - start // 60))  # later segments finish first
+        return f"segment-{int(start // 58)}".encode()
+
+    client = openai.AsyncOpenAI(
+        base_url="http://stt.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(stub_transcription_endpoint)
+        ),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(audio, "plan_audio", plan_audio)
+    monkeypatch.setattr(audio, "cut_segment", cut_segment)
+    partials: list[str] = []
+
+    async def on_partial(text: str) -> None:
+        await asyncio.sleep(0)
+        partials.append(text)
+
+    text = await services.stt_response(BytesIO(VOICE), on_partial=on_partial)
+
+    assert text == "so the plan for today is to ship the voice pipeline."
+    assert partials == [
+        "so the plan for today is",
+        "so the plan for today is to ship the",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("duration", [None, 20])
+async def test_audio_ffmpeg_cannot_plan_is_transcribed_whole(
+    monkeypatch: pytest.MonkeyPatch, duration: float | None
+) -> None:
+    planned: list[bytes] = []
+
+    async def plan_audio(data: bytes, **kwargs: object) -> None:
+        await asyncio.sleep(0)
+        planned.append(data)
+        raise audio.AudioError("moov atom not found")
+
+    async def transcribe(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0)
+        return httpx.Response(200, json={"text": "the whole note"})
+
+    client = openai.AsyncOpenAI(
+        base_url="http://stt.test/v1",
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(transcribe)),
+    )
+    monkeypatch.setattr(services, "get_openai", lambda: client)
+    monkeypatch.setattr(audio, "plan_audio", plan_audio)
+    monkeypatch.setattr(Settings, "stt_segment_seconds", 60)
+
+    voice_bytes = BytesIO(VOICE)
+    voice_bytes.name = "note.m4a"
+    text = await services.stt_response(voice_bytes, duration=duration)
+
+    assert text == "the whole note"
+    # a note known to be short is not decoded to look for silences
+    assert len(planned) == (duration is None)
+
+
+def test_segments_snap_to_silences() -> None:
+    spans = audio.plan_segments(
+        200, length=60, overlap=1.5, silences=[10, 55, 70, 118, 130, 185]
+    )
+
+    assert spans == [(0, 55), (53.5, 118), (116.5, 185), (183.5, 200)]
@@ -0,0 +1,232 @@
+"""Cut audio into overlapping segments with ffmpeg and stitch transcripts."""
+
+import asyncio
+import itertools
+import re
+import shutil
+import string
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+
+SILENCE = re.compile(rb"silence_(start|end): (-?[\d.]+)")
+PROGRESS = re.compile(rb"time=(\d+):(\d+):([\d.]+)")
+PUNCTUATION = string.punctuation + "،؛؟"
+
+
+class AudioError(RuntimeError):
+    pass
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+async def _ffmpeg(*args: str, data: bytes) -> tuple[bytes, bytes]:
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(data)
+    if process.returncode:
+        raise AudioError(stderr.decode(errors="ignore")[-500:])
+    return stdout, stderr
+
+
+async def detect_silences(
+    data: bytes, *, noise_db: float = -35, min_silence: float = 0.4
+) -> tuple[float, list[float]]:
+    """Duration of `data` and the midpoints of its silences, in seconds."""
+    _, stderr = await _ffmpeg(
+        "-i",
+        "pipe:0",
+        "-af",
+        f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f",
+        "null",
+        "-",
+        data=data,
+    )
+    progress = PROGRESS.findall(stderr)
+    hours, minutes, seconds = progress[-1] if progress else (0, 0, 0)
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    start = None
+    for kind, value in SILENCE.findall(stderr):
+        if kind == b"start":
+            start = float(value)
+        elif start is not None:
+            silences.append((start + float(value)) / 2)
+            start = None
+    return duration, silences
+
+
+def plan_segments(
+    duration: float,
+    *,
+    length: float,
+    overlap: float,
+    silences: Sequence[float] = (),
+) -> list[tuple[float, float]]:
+    """`(start, end)` of segments about `length` seconds long.
+
+    Each cut moves to the nearest silence within a quarter of `length`, and
+    every segment but the first starts `overlap` seconds early so a word at
+    a cut is heard twice instead of being lost.
+    """
+    tolerance = length / 4
+    cuts = []
+    target = length
+    i = 0
+    while target < duration - tolerance:
+        while i < len(silences) and silences[i] < target - tolerance:
+            i += 1
+        j = i
+        while j < len(silences) and silences[j] <= target + tolerance:
+            j += 1
+        nearby = silences[i:j]
+        cut = min(nearby, key=lambda s: abs(s - target), default=target)
+        cuts.append(cut)
+        target = cut + length
+
+    bounds = [0.0, *cuts, duration]
+    return [
+        (max(0.0, start - overlap) if start else 0.0, end)
+        for start, end in itertools.pairwise(bounds)
+    ]
+
+
+async def plan_audio(
+    data: bytes, *, length: float, overlap: float
+) -> list[tuple[float, float]] | None:
+    """Segments for `data`, or None when one request is enough or possible."""
+    if not ffmpeg_available():
+        return None
+    duration, silences = await detect_silences(data)
+    if duration <= length + length / 4:
+        return None
+    return plan_segments(duration, length=length, overlap=overlap, silences=silences)
+
+
+async def cut_segment(data: bytes, start: float, end: float) -> bytes:
+    """Re-encode `[start, end)` of `data` as a standalone OGG/Opus file."""
+    stdout, _ = await _ffmpeg(
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{end - start:.3f}",
+        "-i",
+        "pipe:0",
+        "-vn",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        "32k",
+        "-f",
+        "ogg",
+        "pipe:1",
+        data=data,
+    )
+    return stdout
+
+
+def _write_parts(directory: Path, parts: list[bytes]) -> Path:
+    listing = directory / "parts.txt"
+    names = []
+    for i, part in enumerate(parts):
+        path = directory / f"{i}.ogg"
+        path.write_bytes(part)
+        names.append(f"file '{path}'")
+    listing.write_text("\n".join(names))
+    return listing
+
+
+async def concat_ogg(parts: list[bytes]) -> bytes:
+    """Join OGG/Opus files into one stream with ffmpeg.
+
+    Merely chaining the files is valid Ogg, but some players stop after the
+    first link, so joining more than one file needs ffmpeg.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if not ffmpeg_available():
+        raise AudioError("joining speech segments needs ffmpeg")
+    with tempfile.TemporaryDirectory() as directory:
+        listing = await asyncio.to_thread(_write_parts, Path(directory), parts)
+        stdout, _ = await _ffmpeg(
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            str(listing),
+            "-c",
+            "copy",
+            "-f",
+            "ogg",
+            "pipe:1",
+            data=b"",
+        )
+    return stdout
+
+
+async def write_ogg(path: Path, parts: list[bytes]) -> None:
+    await asyncio.to_thread(path.write_bytes, await concat_ogg(parts))
+
+
+def _normalize(word: str) -> str:
+    return word.strip(PUNCTUATION).lower()
+
+
+class Stitcher:
+    """Join transcripts of overlapping segments, dropping repeated words.
+
+    The seam is the longest run of words that ends the text so far and
+    starts the next transcript, ignoring case and punctuation. One garbled
+    word on either side of the seam (a word cut in half) is tolerated.
+    """
+
+    def __init__(self, max_overlap_words: int = 12) -> None:
+        self.max_overlap_words = max_overlap_words
+        self.words: list[str] = []
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.words)
+
+    def _seam(self, right: list[str]) -> tuple[int, int, int]:
+        left = [_normalize(word) for word in self.words[-self.max_overlap_words :]]
+        head = [_normalize(word) for word in right[: self.max_overlap_words]]
+        best = (0, 0, 0)
+        for drop_left in (0, 1):
+            for drop_right in (0, 1):
+                tail = left[: len(left) - drop_left]
+                rest = head[drop_right:]
+                for size in range(min(len(tail), len(rest)), best[0], -1):
+                    if size < 2 and (drop_left or drop_right):
+                        break
+                    if tail[len(tail) - size :] == rest[:size]:
+                        best = (size, drop_left, drop_right)
+                        break
+        return best
+
+    def add(self, text: str) -> str:
+        right = text.split()
+        size, drop_left, drop_right = self._seam(right)
+        if size:
+            del self.words[len(self.words) - drop_left :]
+            right = right[drop_right + size :]
+        self.words.extend(right)
+        return self.text
+
+
+def stitch(texts: list[str], max_overlap_words: int = 12) -> str:
+    stitcher = Stitcher(max_overlap_words)
+    for text in texts:
+        stitcher.add(text)
+    return stitcher.text
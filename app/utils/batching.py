@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+
+from utils import metrics
+
+BatchFunction = Callable[[list[Hashable]], Awaitable[dict[Hashable, object]]]
+
+
+class BatchLoader:
+    """Collect `load(key)` calls for a short window and resolve them together.
+
+    `batch_fn` receives the distinct keys of a window and returns a mapping
+    of key to value (or to an exception); each waiting caller gets the value
+    of its own key. Missing keys resolve to `None`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: BatchFunction,
+        *,
+        window: float = 0.01,
+        max_batch: int = 100,
+    ) -> None:
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: dict[Hashable, list[asyncio.Future]] = {}
+        self.timer: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> object:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(key, []).append(future)
+        if len(self.pending) >= self.max_batch:
+            self.dispatch()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.window, self.dispatch
+            )
+        return await future
+
+    def dispatch(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, {}
+        task = asyncio.create_task(self._run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: dict[Hashable, list[asyncio.Future]]) -> None:
+        metrics.incr(f"batch.{self.name}.batches")
+        metrics.incr(f"batch.{self.name}.keys", len(batch))
+        try:
+            with metrics.timer(f"batch.{self.name}.latency"):
+                results = await self.batch_fn(list(batch))
+        except Exception as e:
+            logging.exception("batch %s failed for %d keys", self.name, len(batch))
+            results = dict.fromkeys(batch, e)
+
+        for key, futures in batch.items():
+            result = results.get(key)
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,110 @@
+import asyncio
+import dataclasses
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+from utils import metrics
+
+
+@dataclasses.dataclass
+class CacheEntry[T]:
+    value: T | None
+    fresh_until: float
+    stale_until: float
+
+
+class AsyncCache[T]:
+    """Bounded LRU cache for async lookups.
+
+    - concurrent misses on one key share a single load (single-flight),
+    - `None` results are cached for `negative_ttl`,
+    - entries older than `ttl` but younger than `ttl + stale_ttl` are served
+      while a background load refreshes them (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_size: int = 10000,
+        ttl: float = 60 * 60,
+        stale_ttl: float = 0,
+        negative_ttl: float = 60,
+    ) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.entries: OrderedDict[Hashable, CacheEntry[T]] = OrderedDict()
+        self.loading: dict[Hashable, asyncio.Task[T | None]] = {}
+        metrics.gauge(f"cache.{name}.size", lambda: len(self.entries))
+
+    def _count(self, event: str) -> None:
+        metrics.incr(f"cache.{self.name}.{event}")
+
+    def set(self, key: Hashable, value: T | None) -> None:
+        now = time.monotonic()
+        ttl = self.ttl if value is not None else self.negative_ttl
+        stale_ttl = self.stale_ttl if value is not None else 0
+        self.entries[key] = CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self._count("evict")
+
+    def invalidate(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def get(
+        self, key: Hashable, loader: Callable[[], Awaitable[T | None]]
+    ) -> T | None:
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.stale_until:
+            self.entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self._count("hit")
+            else:
+                self._count("stale")
+                self._load(key, loader)
+            return entry.value
+
+        self._count("miss")
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(
+        self, key: Hashable, loader: Callable[[], Awaitable[T | None]]
+    ) -> asyncio.Task[T | None]:
+        task = self.loading.get(key)
+        if task is not None:
+            self._count("coalesced")
+            return task
+
+        task = asyncio.create_task(self._fetch(key, loader))
+        # background refreshes are never awaited; mark their errors retrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.loading[key] = task
+        return task
+
+    async def _fetch(
+        self, key: Hashable, loader: Callable[[], Awaitable[T | None]]
+    ) -> T | None:
+        start = time.perf_counter()
+        try:
+            value = await loader()
+        except Exception:
+            self._count("error")
+            logging.exception("cache %s failed to load %s", self.name, key)
+            raise
+        else:
+            self.set(key, value)
+            return value
+        finally:
+            metrics.observe(f"cache.{self.name}.load", time.perf_counter() - start)
+            self.loading.pop(key, None)
@@ -0,0 +1,68 @@
+import asyncio
+import math
+from collections import deque
+from collections.abc import AsyncGenerator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+MAX_PART_SIZE = 512 * 1024
+MIN_PART_SIZE = 4 * 1024
+
+
+def validate_part_size(part_size: int) -> int:
+    """MTProto requires parts that are 4KB aligned and divide 512KB evenly."""
+    if part_size % MIN_PART_SIZE or MAX_PART_SIZE % part_size:
+        raise ValueError(
+            f"part_size must be a multiple of {MIN_PART_SIZE} dividing {MAX_PART_SIZE}"
+        )
+    return part_size
+
+
+async def _fetch_part(
+    client: "TelegramClient", file: object, file_size: int, part_size: int, index: int
+) -> bytes:
+    chunks = [
+        bytes(chunk)
+        async for chunk in client.iter_download(
+            file,
+            offset=index * part_size,
+            limit=1,
+            request_size=part_size,
+            file_size=file_size,
+        )
+    ]
+    return b"".join(chunks)
+
+
+async def iter_parallel_download(
+    client: "TelegramClient",
+    file: object,
+    file_size: int,
+    *,
+    part_size: int = MAX_PART_SIZE,
+    parallelism: int = 4,
+) -> AsyncGenerator[bytes]:
+    """Download `file` with up to `parallelism` part requests in flight.
+
+    Parts are yielded in order as soon as the head of the window completes,
+    so at most `parallelism` parts are held in memory at once.
+    """
+    validate_part_size(part_size)
+    part_count = math.ceil(file_size / part_size)
+    pending: deque[asyncio.Task[bytes]] = deque()
+    next_index = 0
+    try:
+        while next_index < part_count or pending:
+            while next_index < part_count and len(pending) < parallelism:
+                pending.append(
+                    asyncio.create_task(
+                        _fetch_part(client, file, file_size, part_size, next_index)
+                    )
+                )
+                next_index += 1
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
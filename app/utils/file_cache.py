@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from utils import metrics
+
+
+class FileCache:
+    """Content-addressed files in a directory, evicted least recently used.
+
+    Files are written by a `fill(path)` callback to a temporary name and
+    renamed into place, so readers never see partial files; concurrent
+    misses on a key share one fill. The total size stays under `max_bytes`.
+    """
+
+    def __init__(self, name: str, directory: Path, *, max_bytes: int) -> None:
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.files: OrderedDict[str, int] = OrderedDict()
+        self.size = 0
+        self.filling: dict[str, asyncio.Task[Path]] = {}
+
+        for path in sorted(
+            self.directory.glob("*.bin"), key=lambda path: path.stat().st_mtime
+        ):
+            self.files[path.stem] = path.stat().st_size
+            self.size += self.files[path.stem]
+        for path in self.directory.glob("*.part"):
+            path.unlink(missing_ok=True)
+        metrics.gauge(f"file_cache.{name}.bytes", lambda: self.size)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.files
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    async def get(self, key: str, fill: Callable[[Path], Awaitable[None]]) -> Path:
+        if key in self.files and self.path(key).exists():
+            self.files.move_to_end(key)
+            self.path(key).touch()
+            metrics.lookup(f"file_cache.{self.name}", found=True)
+            return self.path(key)
+
+        task = self.filling.get(key)
+        if task is None:
+            metrics.lookup(f"file_cache.{self.name}", found=False)
+            task = asyncio.create_task(self._fill(key, fill))
+            self.filling[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, fill: Callable[[Path], Awaitable[None]]) -> Path:
+        path = self.path(key)
+        partial = path.with_suffix(".part")
+        try:
+            await fill(partial)
+            partial.replace(path)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            self.filling.pop(key, None)
+
+        self.size += path.stat().st_size - self.files.pop(key, 0)
+        self.files[key] = path.stat().st_size
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        # the newest file stays even if it alone exceeds the budget
+        while self.size > self.max_bytes and len(self.files) > 1:
+            key, size = self.files.popitem(last=False)
+            self.path(key).unlink(missing_ok=True)
+            self.size -= size
+            metrics.incr(f"file_cache.{self.name}.evict")
+            logging.debug("evicted %s from %s", key, self.name)
@@ -0,0 +1,111 @@
+import dataclasses
+import importlib.util
+import logging
+
+import httpx
+import singleton
+
+from server.config import Settings
+from utils import metrics
+
+
+@dataclasses.dataclass
+class Upstream:
+    base_url: str = ""
+    headers: dict[str, str] = dataclasses.field(default_factory=dict)
+    max_connections: int = 20
+    max_keepalive_connections: int | None = None
+    timeout: float = 30
+    proxy: str | None = None
+
+
+def default_upstreams() -> dict[str, Upstream]:
+    return {
+        "openrouter": Upstream(
+            base_url=Settings.openrouter_base_url,
+            max_connections=Settings.openrouter_max_connections,
+            timeout=120,
+            proxy=Settings.proxy,
+        ),
+        "media": Upstream(
+            base_url=Settings.media_base_url,
+            headers={"x-api-key": Settings.media_api_key or ""},
+            max_connections=Settings.media_max_connections,
+            timeout=120,
+        ),
+        "bot_files": Upstream(
+            max_connections=Settings.bot_files_max_connections,
+            timeout=120,
+            proxy=Settings.proxy,
+        ),
+        "ai": Upstream(
+            base_url=Settings.ai_url or "",
+            headers={"x-api-key": Settings.ai_api_key or ""},
+            max_connections=Settings.ai_max_connections,
+        ),
+    }
+
+
+class HttpClients(metaclass=singleton.Singleton):
+    """App-lifetime registry of pooled `httpx.AsyncClient`s, one per upstream."""
+
+    def __init__(self) -> None:
+        self.upstreams = default_upstreams()
+        self.clients: dict[str, httpx.AsyncClient] = {}
+        self.http2 = importlib.util.find_spec("h2") is not None
+
+    def register(self, name: str, upstream: Upstream) -> None:
+        self.upstreams[name] = upstream
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create_client(name)
+            self.clients[name] = client
+        return client
+
+    def _create_client(self, name: str) -> httpx.AsyncClient:
+        upstream = self.upstreams[name]
+        limits = httpx.Limits(
+            max_connections=upstream.max_connections,
+            max_keepalive_connections=(
+                upstream.max_keepalive_connections or upstream.max_connections
+            ),
+            keepalive_expiry=Settings.http_keepalive_expiry,
+        )
+        client = httpx.AsyncClient(
+            base_url=upstream.base_url,
+            headers=upstream.headers,
+            limits=limits,
+            timeout=upstream.timeout,
+            proxy=upstream.proxy,
+            http2=self.http2,
+        )
+        metrics.gauge(f"http_pool.{name}", lambda: self.pool_stats(name))
+        logging.info("opened http client for %s (http2=%s)", name, self.http2)
+        return client
+
+    def pool_stats(self, name: str) -> dict[str, int]:
+        client = self.clients.get(name)
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if client is None or client.is_closed or pool is None:
+            return {"connections": 0, "active": 0, "idle": 0, "pending": 0}
+
+        connections = pool.connections
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "pending": len(getattr(pool, "_requests", [])),
+        }
+
+    async def setup(self) -> None:
+        for name in self.upstreams:
+            self.get(name)
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, {}
+        for name, client in clients.items():
+            await client.aclose()
+            logging.info("closed http client for %s", name)
@@ -0,0 +1,69 @@
+"""Prepare photos for OCR: upright, grayscale and no larger than needed.
+
+Pillow is optional; without it photos are sent as they were taken.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from server.config import Settings
+from utils import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+
+def pillow_available() -> bool:
+    return Image is not None
+
+
+def prepare_for_ocr(data: bytes, *, max_side: int, quality: int) -> bytes:
+    """An upright, grayscale JPEG of `data` fitting in `max_side` pixels.
+
+    The original is returned when it cannot be read or is already smaller.
+    """
+    try:
+        with Image.open(BytesIO(data)) as original:
+            image = ImageOps.exif_transpose(original).convert("L")
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logging.warning("preparing photo for OCR failed", exc_info=True)
+        return data
+    prepared = output.getvalue()
+    return prepared if len(prepared) < len(data) else data
+
+
+@functools.cache
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=Settings.ocr_image_workers, thread_name_prefix="images"
+    )
+
+
+async def prepare(data: bytes) -> bytes:
+    """Run `prepare_for_ocr` with the configured size and quality.
+
+    Work runs in a small dedicated thread pool, so a burst of photos
+    neither blocks the event loop nor crowds out other threaded work.
+    """
+    if not pillow_available():
+        return data
+    with metrics.timer("images.prepare"):
+        prepared = await asyncio.get_running_loop().run_in_executor(
+            _executor(),
+            functools.partial(
+                prepare_for_ocr,
+                data,
+                max_side=Settings.ocr_image_side,
+                quality=Settings.ocr_image_quality,
+            ),
+        )
+    metrics.incr("images.bytes_saved", len(data) - len(prepared))
+    return prepared
@@ -0,0 +1,229 @@
+"""Render LLM-style Markdown as Telegram plain text plus message entities.
+
+Sending entities instead of a parse mode means Telegram never has to parse
+the text, so malformed model output cannot be rejected with "can't parse
+entities". Markers that are not closed on their line are kept as literal
+text. Offsets are counted in UTF-16 code units as the Bot API expects.
+"""
+
+import dataclasses
+import re
+
+from telebot import types
+
+FENCE = re.compile(r"^\s*```\s*([\w+#.-]*)\s*$")
+HEADING = re.compile(r"^#{1,6}\s+")
+BULLET = re.compile(r"^(\s*)[-*+]\s+")
+QUOTE = re.compile(r"^>\s?")
+INLINE = re.compile(
+    r"\\([\\`*_~\[\]()#>+\-.!|{}=])"
+    r"|`|\*\*|__|~~|\*|_|\["
+    r"|\]\(((?:https?|tg)://[^\s()]+)\)"
+)
+STYLES = {
+    "**": "bold",
+    "__": "bold",
+    "*": "italic",
+    "_": "italic",
+    "~~": "strikethrough",
+}
+
+
+def utf16_len(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+@dataclasses.dataclass
+class _Delimiter:
+    mark: str
+    url: str | None = None
+    kind: str | None = None  # set on openers that found their closer
+    opener: "_Delimiter | None" = None  # set on closers
+    start: int = 0
+
+
+class _Output:
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self.offset = 0
+        self.newlines = 0
+        self.entities: list[types.MessageEntity] = []
+
+    def line_break(self) -> None:
+        if self.parts:
+            self.newlines += 1
+
+    def mark(self) -> int:
+        """Flush pending line breaks and return the current offset."""
+        if self.newlines:
+            self.parts.append("\n" * self.newlines)
+            self.offset += self.newlines
+            self.newlines = 0
+        return self.offset
+
+    def write(self, text: str) -> None:
+        if text:
+            self.mark()
+            self.parts.append(text)
+            self.offset += utf16_len(text)
+
+    def add(self, kind: str, start: int, **kwargs: object) -> None:
+        if self.offset > start:
+            self.entities.append(
+                types.MessageEntity(kind, start, self.offset - start, **kwargs)
+            )
+
+
+def _flanking(line: str, start: int, end: int) -> tuple[bool, bool]:
+    before = line[start - 1] if start else " "
+    after = line[end] if end < len(line) else " "
+    can_open = not after.isspace()
+    can_close = not before.isspace()
+    if line[start] == "_":
+        # snake_case identifiers are not emphasis
+        can_open = can_open and not before.isalnum()
+        can_close = can_close and not after.isalnum()
+    return can_open, can_close
+
+
+class _Pairing:
+    """Open delimiters of one line; closing pops everything above the opener."""
+
+    def __init__(self) -> None:
+        self.stack: list[_Delimiter] = []
+        self.counts: dict[str, int] = {}
+
+    def open(self, delimiter: _Delimiter) -> None:
+        self.stack.append(delimiter)
+        self.counts[delimiter.mark] = self.counts.get(delimiter.mark, 0) + 1
+
+    def close(self, delimiter: _Delimiter, opener_mark: str, kind: str) -> bool:
+        if not self.counts.get(opener_mark):
+            return False
+        while True:
+            opener = self.stack.pop()
+            self.counts[opener.mark] -= 1
+            if opener.mark == opener_mark:
+                opener.kind = kind
+                delimiter.opener = opener
+                return True
+
+    def add(self, line: str, match: re.Match) -> _Delimiter:
+        mark = match.group()
+        delimiter = _Delimiter(mark, url=match.group(2))
+        if delimiter.url:
+            self.close(delimiter, "[", "text_link")
+            return delimiter
+
+        if mark == "[":
+            self.open(delimiter)
+            return delimiter
+
+        can_open, can_close = _flanking(line, match.start(), match.end())
+        closed = can_close and self.close(delimiter, mark, STYLES[mark])
+        if can_open and not closed:
+            self.open(delimiter)
+        return delimiter
+
+
+def _tokenize(line: str) -> list[str | tuple[str] | _Delimiter]:
+    """Split `line` into text, `(code,)` spans and delimiters.
+
+    Delimiters are paired with a stack in the same pass: a closer points at
+    its opener and the opener gets the entity kind; unpaired ones stay
+    literal text.
+    """
+    segments: list[str | tuple[str] | _Delimiter] = []
+    pairing = _Pairing()
+
+    pos = 0
+    while match := INLINE.search(line, pos):
+        segments.append(line[pos : match.start()])
+        pos = match.end()
+        if match.group(1):
+            segments.append(match.group(1))
+        elif match.group() != "`":
+            segments.append(pairing.add(line, match))
+        elif (end := line.find("`", pos)) > pos:
+            segments.append((line[pos:end],))
+            pos = end + 1
+        else:
+            segments.append("`")
+
+    segments.append(line[pos:])
+    return segments
+
+
+def _render_inline(out: _Output, line: str) -> None:
+    for segment in _tokenize(line):
+        if isinstance(segment, str):
+            out.write(segment)
+        elif isinstance(segment, tuple):
+            start = out.mark()
+            out.write(segment[0])
+            out.add("code", start)
+        elif segment.opener is not None:
+            opener = segment.opener
+            extra = {"url": segment.url} if segment.url else {}
+            out.add(opener.kind, opener.start, **extra)
+        elif segment.kind is not None:
+            segment.start = out.mark()
+        else:
+            out.write(segment.mark)
+
+
+def _render_line(out: _Output, line: str) -> None:
+    if heading := HEADING.match(line):
+        start = out.mark()
+        _render_inline(out, line[heading.end() :])
+        out.add("bold", start)
+    elif bullet := BULLET.match(line):
+        out.write(f"{bullet.group(1)}• ")
+        _render_inline(out, line[bullet.end() :])
+    else:
+        _render_inline(out, line)
+
+
+def render(text: str) -> tuple[str, list[types.MessageEntity]]:
+    """Convert Markdown `text` to plain text and Telegram message entities."""
+    out = _Output()
+    language: str | None = None
+    code_start: int | None = None
+    quote_start: int | None = None
+
+    for line in text.strip().split("\n"):
+        fence = FENCE.match(line)
+        if language is not None:
+            if fence and not fence.group(1):
+                if code_start is not None:
+                    out.add("pre", code_start, language=language or None)
+                language = code_start = None
+            else:
+                out.line_break()
+                code_start = out.mark() if code_start is None else code_start
+                out.write(line)
+            continue
+
+        quote = QUOTE.match(line)
+        if quote_start is not None and not quote:
+            out.add("blockquote", quote_start)
+            quote_start = None
+        if fence:
+            language = fence.group(1)
+            continue
+
+        out.line_break()
+        if quote:
+            quote_start = out.mark() if quote_start is None else quote_start
+            line = line[quote.end() :]
+        _render_line(out, line)
+
+    if language is not None and code_start is not None:
+        out.add("pre", code_start, language=language or None)
+    if quote_start is not None:
+        out.add("blockquote", quote_start)
+
+    out.entities.sort(key=lambda entity: (entity.offset, -entity.length))
+    return "".join(out.parts), out.entities
@@ -1,26 +1,37 @@
+import asyncio
+import collections
+import functools
+import logging
+import shutil
+import tempfile
+import zipfile
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 from io import BytesIO
+from typing import BinaryIO
 
 import httpx
 
 from server.config import Settings
+from utils import metrics
+from utils.http_clients import HttpClients
 
 
 @asynccontextmanager
 async def get_media_client() -> AsyncGenerator[httpx.AsyncClient]:
-    async with httpx.AsyncClient(
-        base_url="https://media.uln.me/api/media/v1/",
-        headers={"x-api-key": Settings.media_api_key or ""},
-    ) as client:
-        yield client
+    yield HttpClients().get("media")
 
 
-async def upload_file(file: BytesIO, file_name: str | None = None) -> str:
+async def upload_file(file: BinaryIO, file_name: str | None = None) -> str:
+    """Upload `file` and return its public URL.
+
+    The multipart body is read from `file` in chunks while it is sent, so
+    spooled files are never loaded into memory whole.
+    """
     async with get_media_client() as media_client:
         upload_response = await media_client.post(
             "/f/upload",
-            files={"file": file},
+            files={"file": (file_name or file.name, file)},
             data={"filename": file_name or file.name},
         )
         upload_response.raise_for_status()
@@ -31,3 +42,108 @@ async def upload_file(file: BytesIO, file_name: str | None = None) -> str:
         )
         response.raise_for_status()
         return upload_response.json().get("url")
+
+
+archive_tasks: set[asyncio.Task] = set()
+
+
+def archive_file(data: bytes, file_name: str) -> asyncio.Task:
+    """Upload a copy of `data` in the background; failures are only logged."""
+
+    async def archive() -> str | None:
+        try:
+            return await upload_file(BytesIO(data), file_name=file_name)
+        except httpx.HTTPError:
+            logging.warning("archiving %s failed", file_name, exc_info=True)
+            return None
+
+    task = asyncio.create_task(archive())
+    archive_tasks.add(task)
+    task.add_done_callback(archive_tasks.discard)
+    return task
+
+
+async def spool(chunks: AsyncGenerator[bytes]) -> tempfile.SpooledTemporaryFile:
+    """Collect `chunks` in memory up to `MEDIA_SPOOL_THRESHOLD`, on disk above."""
+    file = tempfile.SpooledTemporaryFile(  # noqa: SIM115 the caller closes it
+        max_size=Settings.media_spool_threshold
+    )
+    try:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+def zip_file(file: BinaryIO, name: str) -> tempfile.SpooledTemporaryFile:
+    """Deflate `file` into a spooled ZIP archive holding it as `name`."""
+    archive = tempfile.SpooledTemporaryFile(  # noqa: SIM115 the caller closes it
+        max_size=Settings.media_spool_threshold
+    )
+    with (
+        zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_archive,
+        zip_archive.open(name, "w") as entry,
+    ):
+        shutil.copyfileobj(file, entry)
+    archive.seek(0)
+    return archive
+
+
+class ByteBudget:
+    """Bytes of media being downloaded or uploaded at once, across the process.
+
+    Reservations are granted in arrival order; one larger than the whole
+    budget waits for everything else and then runs alone.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.used = 0
+        self.waiters: collections.deque[tuple[int, asyncio.Future[None]]] = (
+            collections.deque()
+        )
+
+    @asynccontextmanager
+    async def reserve(self, size: int) -> AsyncGenerator[None]:
+        size = min(size, self.capacity)
+        if self.waiters or self.used + size > self.capacity:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append((size, waiter))
+            metrics.incr("media.budget_waits")
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(size)
+                else:
+                    self.waiters.remove((size, waiter))
+                    self._wake()
+                raise
+        else:
+            self.used += size
+
+        try:
+            yield
+        finally:
+            self._release(size)
+
+    def _release(self, size: int) -> None:
+        self.used -= size
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters and self.used + self.waiters[0][0] <= self.capacity:
+            size, waiter = self.waiters.popleft()
+            self.used += size
+            waiter.set_result(None)
+
+
+@functools.cache
+def budget() -> ByteBudget:
+    media_budget = ByteBudget(Settings.media_inflight_bytes)
+    metrics.gauge("media.inflight_bytes", lambda: media_budget.used)
+    return media_budget
@@ -0,0 +1,90 @@
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+
+_counters: dict[str, float] = defaultdict(float)
+_gauges: dict[str, Callable[[], object] | float] = {}
+_timings: dict[str, deque[float]] = {}
+_timing_totals: dict[str, list[float]] = {}
+
+TIMING_WINDOW = 1024
+
+
+def incr(name: str, value: float = 1) -> None:
+    _counters[name] += value
+
+
+def lookup(name: str, found: bool) -> None:
+    """Count a cache lookup as `name.hit` or `name.miss` and gauge the hit rate."""
+    incr(f"{name}.hit" if found else f"{name}.miss")
+    if f"{name}.hit_rate" not in _gauges:
+        gauge(f"{name}.hit_rate", lambda: _hit_rate(name))
+
+
+def _hit_rate(name: str) -> float:
+    hits, misses = _counters[f"{name}.hit"], _counters[f"{name}.miss"]
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def gauge(name: str, value: Callable[[], object] | float) -> None:
+    """Set a gauge to a value, or to a callable evaluated at snapshot time."""
+    _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    if name not in _timings:
+        _timings[name] = deque(maxlen=TIMING_WINDOW)
+        _timing_totals[name] = [0, 0.0, 0.0]
+    _timings[name].append(seconds)
+    totals = _timing_totals[name]
+    totals[0] += 1
+    totals[1] += seconds
+    totals[2] = max(totals[2], seconds)
+
+
+@contextmanager
+def timer(name: str) -> Generator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def timing_summary(name: str) -> dict[str, float]:
+    window = sorted(_timings.get(name, ()))
+    count, total, maximum = _timing_totals.get(name, (0, 0.0, 0.0))
+    return {
+        "count": count,
+        "sum": total,
+        "max": maximum,
+        "p50": _percentile(window, 50),
+        "p95": _percentile(window, 95),
+        "p99": _percentile(window, 99),
+    }
+
+
+def snapshot() -> dict[str, dict[str, object]]:
+    return {
+        "counters": dict(_counters),
+        "gauges": {
+            name: value() if callable(value) else value
+            for name, value in _gauges.items()
+        },
+        "timings": {name: timing_summary(name) for name in _timings},
+    }
+
+
+def reset() -> None:
+    _counters.clear()
+    _gauges.clear()
+    _timings.clear()
+    _timing_totals.clear()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from utils import metrics
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    `reserve` takes a token immediately, letting the balance go negative,
+    and returns how long the caller must wait for it. Callers are therefore
+    served in reservation order without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Make the next token available no sooner than `seconds` from now."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class ChatRateLimiter:
+    """Global, per-chat and per-group budgets for one bot's outbound calls."""
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3,
+        max_chats: int = 10000,
+    ) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_chats = max_chats
+        self.chats: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+        self.delays: OrderedDict[Hashable, float] = OrderedDict()
+
+    @staticmethod
+    def is_group(chat_id: Hashable) -> bool:
+        return isinstance(chat_id, int) and chat_id < 0
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if self.is_group(chat_id):
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chats[chat_id] = bucket
+            if len(self.chats) > self.max_chats:
+                self.chats.popitem(last=False)
+        self.chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: Hashable | None = None) -> float:
+        start = time.monotonic()
+        if chat_id is not None:
+            await asyncio.sleep(self._chat_bucket(chat_id).reserve())
+        await asyncio.sleep(self.global_bucket.reserve())
+        waited = time.monotonic() - start
+
+        kind = (
+            "none" if chat_id is None else "group" if self.is_group(chat_id) else "chat"
+        )
+        metrics.observe(f"bot.outbound.wait.{kind}", waited)
+        if chat_id is not None:
+            self.delays[chat_id] = waited
+            self.delays.move_to_end(chat_id)
+            if len(self.delays) > self.max_chats:
+                self.delays.popitem(last=False)
+        return waited
+
+    def pause(self, chat_id: Hashable | None, seconds: float) -> None:
+        if chat_id is None:
+            self.global_bucket.pause(seconds)
+        else:
+            self._chat_bucket(chat_id).pause(seconds)
+
+    def slowest_chats(self, count: int = 10) -> dict[str, float]:
+        """Last queueing delay of the `count` most delayed chats."""
+        slowest = sorted(self.delays.items(), key=lambda item: item[1], reverse=True)
+        return {str(chat_id): delay for chat_id, delay in slowest[:count]}
@@ -1,3 +1,4 @@
+import bisect
 import re
 import secrets
 import string
@@ -33,100 +34,241 @@ def format_string_fixer(**kwargs: object) -> list[dict[str, object]]:
     return target
 
 
-def escape_markdown(text: str) -> str:
-    replacements = [
-        ("_", r"\_"),
-        ("*", r"\*"),
-        ("[", r"\["),
-        ("]", r"\]"),
-        ("(", r"\("),
-        (")", r"\)"),
-        ("~", r"\~"),
-        # ("`", r"\`"),
-        (">", r"\>"),
-        ("#", r"\#"),
-        ("+", r"\+"),
-        ("-", r"\-"),
-        ("=", r"\="),
-        ("|", r"\|"),
-        ("{", r"\{"),
-        ("}", r"\}"),
-        (".", r"\."),
-        ("!", r"\!"),
-        ("=", r"\="),
-    ]
-
-    for old, new in replacements:
-        text = text.replace(old, new)
+MARKDOWN_SPECIALS = "_*[]()~>#+-=|{}.!"
 
-    return text
 
+def escape_markdown(text: str) -> str:
+    # str.replace per character beats a single regex or translate pass here
+    for char in MARKDOWN_SPECIALS:
+        if char in text:
+            text = text.replace(char, "\\" + char)
+    return text
 
-def _split_sentence(sentence: str, max_chunk_size: int, current_chunk: str) -> str:
-    """Split a sentence into chunks."""
-    if len(sentence) > max_chunk_size:
-        # Split sentence into words
-        words = sentence.split(" ")
-        for word in words:
-            if len(current_chunk) + len(word) + 1 > max_chunk_size and current_chunk:
-                return current_chunk.strip()
-            current_chunk += word + " "
-    else:
-        current_chunk += sentence + " "
-
-    return current_chunk
-
-
-def _split_paragraph(
-    paragraph: str, max_chunk_size: int, current_chunk: str
-) -> tuple[list[str], str]:
-    """Split a paragraph into chunks."""
-    chunks = []
-
-    if len(current_chunk) + len(paragraph) + 1 > max_chunk_size and current_chunk:
-        if current_chunk.count("```") % 2 == 1:
-            chunks.append(current_chunk[: current_chunk.rfind("```")].strip())
-            current_chunk = current_chunk[current_chunk.rfind("```") :]
-            return chunks, current_chunk
-
-        chunks.append(current_chunk.strip())
-        current_chunk = ""
-        return chunks, current_chunk
-
-    if len(paragraph) > max_chunk_size:
-        # Split paragraph into sentences
-        sentences = re.split(r"(?<=[.!?]) +", paragraph)
-        for sentence in sentences:
-            if (
-                len(current_chunk) + len(sentence) + 1 > max_chunk_size
-                and current_chunk
-            ):
-                chunks.append(current_chunk.strip())
-                current_chunk = ""
-
-            current_chunk = _split_sentence(sentence, max_chunk_size, current_chunk)
-    else:
-        current_chunk += paragraph + "\n"
 
-    return chunks, current_chunk
+FENCE = "```"
+FENCE_CLOSE = "\n" + FENCE
+SENTENCE_BREAK = re.compile(r"[.!?\u061f][ \t]")
+MARKDOWN_TOKENS = re.compile(r"[`*_~\[\])](?:(?<=\*)\*|(?<=_)_|(?<=~)~)?")
+
+
+def _entity_spans(line: str) -> list[tuple[int, int]]:
+    """Sorted `(start, end)` spans of `line` covered by inline entities.
+
+    Inline code, bold/italic/strike markers and links are tracked in one pass
+    over the markup characters; an entity left open runs to the end.
+    """
+    spans = []
+    in_code = False
+    markers: set[str] = set()
+    link = 0  # 1 inside [text], 2 inside (url)
+    opened_at = 0
+
+    for match in MARKDOWN_TOKENS.finditer(line):
+        mark = match.group()
+        was_open = bool(in_code or markers or link)
+        if mark == "`":
+            in_code = not in_code
+        elif in_code:
+            continue
+        elif mark == "[":
+            link = link or 1
+        elif mark == "]":
+            link = 2 if link == 1 and line.startswith("(", match.end()) else link
+        elif mark == ")":
+            link = 0 if link == 2 else link
+        else:
+            markers ^= {mark}
+
+        is_open = bool(in_code or markers or link)
+        if is_open and not was_open:
+            opened_at = match.start()
+        elif was_open and not is_open:
+            spans.append((opened_at, match.end()))
+
+    if in_code or markers or link:
+        spans.append((opened_at, len(line)))
+    return spans
+
+
+def _cut_point(line: str, start: int, end: int, spans: list[tuple[int, int]]) -> int:
+    """Offset in `(start, end]` to cut `line` at, best candidate first.
+
+    A sentence end outside entities wins over any word break outside
+    entities, which wins over any word break; otherwise the cut is mid-word.
+    """
+
+    def entity_start(space: int) -> int | None:
+        i = bisect.bisect_right(spans, (space, len(line))) - 1
+        return spans[i][0] if i >= 0 and spans[i][1] > space else None
+
+    sentences = list(SENTENCE_BREAK.finditer(line, start, end))
+    for match in reversed(sentences):
+        if entity_start(match.start() + 1) is None:
+            return match.end()
+
+    last_space = -1
+    stop = end
+    while (
+        space := max(line.rfind(" ", start, stop), line.rfind("\t", start, stop))
+    ) != -1:
+        last_space = max(last_space, space)
+        opened_at = entity_start(space)
+        if opened_at is None:
+            return space + 1
+        stop = opened_at
+    return last_space + 1 if last_space != -1 else end
+
+
+class TextSplitter:
+    """Single-pass, markdown-aware splitter for Telegram-sized messages.
+
+    Text is consumed line by line; a line that fits is never broken. Longer
+    lines are cut at a sentence end, then at a word break outside inline
+    entities, then at any whitespace and only then mid-word. Code blocks
+    that straddle two chunks are closed and reopened with their info string,
+    and every chunk is at most `max_chunk_size` characters.
+
+    `feed` accepts arbitrary pieces of a token stream and returns the chunks
+    completed so far; `flush` returns the rest.
+    """
+
+    def __init__(self, max_chunk_size: int = 4096) -> None:
+        if max_chunk_size < 4 * len(FENCE_CLOSE):
+            raise ValueError(f"max_chunk_size too small: {max_chunk_size}")
+        self.max_chunk_size = max_chunk_size
+        self.fence: str | None = None
+        self.parts: list[str] = []
+        self.size = 0
+        self.pending: list[str] = []
+        self.pending_size = 0
+        self.continued = False
+        self.reopened = False
+        self.chunks: list[str] = []
+
+    def feed(self, text: str) -> list[str]:
+        start = 0
+        while (end := text.find("\n", start)) != -1:
+            self.pending.append(text[start : end + 1])
+            self._add_line("".join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+            start = end + 1
+
+        if start < len(text):
+            self.pending.append(text[start:])
+            self.pending_size += len(text) - start
+        if self.pending_size > self.max_chunk_size:
+            self._emit()
+            line = "".join(self.pending)
+            is_fence = not self.continued and line.lstrip().startswith(FENCE)
+            *full, tail = self._cut_line(line, is_fence=is_fence)
+            for piece in full:
+                self._append(piece)
+                self._emit()
+            self.pending = [tail]
+            self.pending_size = len(tail)
+            # the tail is the middle of a line; it cannot open or close a block
+            self.continued = True
+
+        return self._take()
+
+    def flush(self) -> list[str]:
+        if self.pending:
+            self._add_line("".join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+        self._emit()
+        return self._take()
+
+    def _take(self) -> list[str]:
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+    def _reopen(self) -> str:
+        if self.fence is None:
+            return ""
+        # a long info string would eat the budget of every continuation
+        fence = self.fence if len(self.fence) <= self.max_chunk_size // 4 else FENCE
+        return fence + "\n"
+
+    def _append(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+        self.reopened = False
+
+    def _emit(self) -> None:
+        reopen = self._reopen()
+        text = "".join(self.parts)
+        # a chunk holding only the reopened fence has nothing to send
+        if text.strip() and not self.reopened:
+            text = text.strip()
+            if self.fence is not None:
+                text += FENCE_CLOSE
+            self.chunks.append(text)
+        self.parts = [reopen] if reopen else []
+        self.size = len(reopen)
+        self.reopened = bool(reopen)
+
+    def _add_line(self, line: str) -> None:
+        continued, self.continued = self.continued, False
+        is_fence = not continued and line.lstrip().startswith(FENCE)
+        fence_after = (self.fence is None) if is_fence else (self.fence is not None)
+        reserve = len(FENCE_CLOSE) if fence_after else 0
+
+        if self.size + len(line) + reserve > self.max_chunk_size:
+            self._emit()
+        if self.size + len(line) + reserve > self.max_chunk_size:
+            *full, line = self._cut_line(line, is_fence=is_fence)
+            for piece in full:
+                self._append(piece)
+                self._emit()
+            is_fence = False
+        self._append(line)
+
+        if is_fence:
+            self._toggle_fence(line)
+
+    def _toggle_fence(self, line: str) -> None:
+        self.fence = None if self.fence is not None else line.strip()
+
+    def _cut_line(self, line: str, *, is_fence: bool) -> list[str]:
+        """`_cut` `line`; a fence line opens or closes its block first.
+
+        The marker is in the first piece, so the rest of the line is inside
+        a block it opens (closed and reopened with the whole line's info
+        string) or after a block it closes; a piece never becomes a marker.
+        """
+        if is_fence:
+            self._toggle_fence(line)
+        return self._cut(line)
+
+    def _cut(self, line: str) -> list[str]:
+        """Cut `line` into pieces that each fit an empty chunk."""
+        reserve = len(FENCE_CLOSE) if self.fence is not None else 0
+        # the first piece joins what the current chunk already holds
+        first_limit = self.max_chunk_size - self.size - reserve
+        limit = self.max_chunk_size - len(self._reopen()) - reserve
+        # inside a code block markup characters are literal
+        spans = _entity_spans(line) if self.fence is None else []
+
+        pieces = []
+        start = 0
+        while len(line) - start > (limit if pieces else first_limit):
+            end = start + (limit if pieces else first_limit)
+            cut = _cut_point(line, start, end, spans)
+            pieces.append(line[start:cut])
+            start = cut
+        pieces.append(line[start:])
+        return pieces
 
 
 def split_text(text: str, max_chunk_size: int = 4096) -> list[str]:
-    """Split text into chunks while preserving structure."""
-    paragraphs = text.split("\n")
-    chunks = []
-    current_chunk = ""
-
-    for paragraph in paragraphs:
-        new_chunks, current_chunk = _split_paragraph(
-            paragraph, max_chunk_size, current_chunk
-        )
-        chunks.extend(new_chunks)
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    """Split text into chunks while preserving structure.
 
-    return chunks
+    Empty or blank text is one chunk of its own, as callers send each chunk.
+    """
+    splitter = TextSplitter(max_chunk_size)
+    return splitter.feed(text) + splitter.flush() or [text]
 
 
 def replace_unicode_digits(match: re.Match) -> str: